@@ -0,0 +1,232 @@
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+import constants
+from natsort import natsorted
+from Benchmark.benchmark_isolator import create_logger
+from DataExtractor.batch_augmenter import BatchAugmenter
+from DataExtractor.extractor import Extractor
+
+
+def main():
+    logger = create_logger()
+
+    # compare the augmentation of the image data generator with the batch augmenter
+    benchmark_augmentation(logger, count_images=200, aug_count=10)
+
+    # compare the renaming by decoding and encoding every image with the renaming of the files
+    benchmark_rename(logger, count_files=100000)
+
+    # compare listing the directories with the queries of the catalog
+    benchmark_catalog(logger, count_files=100000)
+
+
+def create_synthetic_images(directory, count_images, seed=0):
+    random_state = np.random.RandomState(seed)
+    for index in range(count_images):
+        # regions of interest have different sizes
+        height = random_state.randint(30, 60)
+        width = random_state.randint(20, 40)
+        image = random_state.randint(0, 255, size=(height, width, 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(directory, '{}.jpg'.format(index)), image)
+
+
+def augment_with_image_data_generator(directory, aug_count):
+    # the previous augmentation, one flow of the image data generator per image, saved by PIL
+    from tensorflow.python.keras.preprocessing.image import ImageDataGenerator
+    from tensorflow.python.keras.preprocessing.image import array_to_img, img_to_array, load_img
+
+    image_data_gen = ImageDataGenerator(
+        rotation_range=15,
+        width_shift_range=0.1,
+        height_shift_range=0.1,
+        shear_range=0.2,
+        zoom_range=[0.8, 1.1],
+        brightness_range=[0.5, 1.5],
+        fill_mode='reflect')
+
+    count = 0
+    for img in sorted(os.listdir(directory)):
+        image = img_to_array(load_img(os.path.join(directory, img)))
+        image = image.reshape((1,) + image.shape)
+        for i, new_images in enumerate(image_data_gen.flow(image, batch_size=1)):
+            new_image = array_to_img(new_images[0], scale=True)
+            new_image.save(os.path.join(directory, '{:s}_{:s}_aug.jpg'.format(img, str(i))))
+            count += 1
+            if i >= aug_count:
+                break
+
+    return count
+
+
+def augment_with_batch_augmenter(directory, aug_count):
+    augmenter = BatchAugmenter(seed=0)
+
+    count = 0
+    for img in sorted(os.listdir(directory)):
+        image = cv2.imread(os.path.join(directory, img))
+        for i, new_image in enumerate(augmenter.augment_image(image, aug_count + 1)):
+            cv2.imwrite(os.path.join(directory, '{:s}_{:s}_aug.jpg'.format(img, str(i))), new_image)
+            count += 1
+
+    return count
+
+
+def augment_in_memory(images, aug_count):
+    # augmentation straight into the training data, as in Extractor.create_training_data(aug_count)
+    augmenter = BatchAugmenter(seed=0)
+    augmented_images = augmenter.augment(np.repeat(images, aug_count, axis=0))
+
+    return len(augmented_images)
+
+
+def benchmark_augmentation(logger, count_images=200, aug_count=10):
+    methods = [('image data generator', augment_with_image_data_generator),
+               ('batch augmenter', augment_with_batch_augmenter)]
+
+    for name, method in methods:
+        directory = tempfile.mkdtemp()
+        try:
+            create_synthetic_images(directory, count_images)
+
+            start = time.perf_counter()
+            try:
+                count = method(directory, aug_count)
+            except ImportError as e:
+                logger.warning('[Benchmark] augmentation {}: skipped ({})'.format(name, e))
+                continue
+            elapsed = time.perf_counter() - start
+
+            logger.info('[Benchmark] augmentation {}: {} images in {:.2f}s, {:.0f} images/s'.format(
+                name, count, elapsed, count / elapsed))
+        finally:
+            shutil.rmtree(directory)
+
+    images = np.random.RandomState(0).randint(0, 255, size=(count_images, 28, 28, 1), dtype=np.uint8)
+    start = time.perf_counter()
+    count = augment_in_memory(images, aug_count)
+    elapsed = time.perf_counter() - start
+
+    # the brightness is applied to the whole batch, the warps still run per image (see BatchAugmenter.augment)
+    logger.info('[Benchmark] augmentation in memory (28x28, warpAffine per image, brightness per batch): {} images '
+                'in {:.2f}s, {:.0f} images/s'.format(count, elapsed, count / elapsed))
+
+
+def rename_with_reencoding(category_dir):
+    # the previous renaming, every image is decoded, written again with a temporary name and renamed
+    list_category_dir = natsorted(os.listdir(category_dir))
+
+    renamed = []
+    for index, image in enumerate(list_category_dir):
+        image_array = cv2.imread(os.path.join(category_dir, image))
+        if image_array is None:
+            continue
+        new_image_path = os.path.join(category_dir, '{:d}_renaming.jpg'.format(index))
+        cv2.imwrite(new_image_path, image_array)
+        os.remove(os.path.join(category_dir, image))
+        renamed.append((index, new_image_path))
+
+    for index, new_image_path in renamed:
+        os.rename(new_image_path, os.path.join(category_dir, '{:d}.jpg'.format(index)))
+
+    return len(renamed)
+
+
+def rename_with_extractor(category_dir):
+    # the catalog is synced before the timing, the extractor keeps it up to date after the extraction
+    extractor = Extractor()
+    extractor.current_working_dir = os.path.dirname(os.path.dirname(category_dir))
+    extractor.sync_catalog()
+
+    def rename():
+        extractor.rename_images_in_categories()
+        return len(os.listdir(category_dir))
+
+    return rename
+
+
+def create_extracted_images(working_dir, count_files):
+    # all categories exist, only the first one contains the images, with the names after the extraction
+    for category in constants.CATEGORIES:
+        os.makedirs(os.path.join(working_dir, constants.OUTPUT_DATA_DIR, category))
+    category_dir = os.path.join(working_dir, constants.OUTPUT_DATA_DIR, constants.CATEGORIES[0])
+    create_synthetic_images(category_dir, count_files)
+    for index in range(count_files):
+        os.rename(os.path.join(category_dir, '{}.jpg'.format(index)),
+                  os.path.join(category_dir, 'frame_{}_0_info.jpg'.format(index)))
+
+    return category_dir
+
+
+def benchmark_rename(logger, count_files=100000):
+    # 0: name, 1: creates the function that renames the images of the category
+    methods = [('decode and encode', lambda category_dir: lambda: rename_with_reencoding(category_dir)),
+               ('file renames', rename_with_extractor)]
+
+    for name, method in methods:
+        working_dir = tempfile.mkdtemp()
+        try:
+            # every image gets a new name
+            category_dir = create_extracted_images(working_dir, count_files)
+            size_before = sum(os.path.getsize(os.path.join(category_dir, img)) for img in os.listdir(category_dir))
+
+            rename = method(category_dir)
+            start = time.perf_counter()
+            count = rename()
+            elapsed = time.perf_counter() - start
+
+            size_after = sum(os.path.getsize(os.path.join(category_dir, img)) for img in os.listdir(category_dir))
+            logger.info('[Benchmark] rename {}: {} files in {:.2f}s, {:.0f} files/s, size {:.1f}MB -> {:.1f}MB'.format(
+                name, count, elapsed, count / elapsed, size_before / 1e6, size_after / 1e6))
+        finally:
+            shutil.rmtree(working_dir)
+
+
+def list_images_with_stats(category_dir):
+    # the previous listing of the extractor operations, the directory is listed and every file is stat'ed
+    list_category_dir = natsorted(os.listdir(category_dir))
+
+    return [(img, os.stat(os.path.join(category_dir, img))) for img in list_category_dir]
+
+
+def benchmark_catalog(logger, count_files=100000):
+    working_dir = tempfile.mkdtemp()
+    try:
+        category_dir = create_extracted_images(working_dir, count_files)
+        extractor = Extractor()
+        extractor.current_working_dir = working_dir
+
+        # the first sync reads every file, later ones only list the directories
+        for name in ['first sync', 'sync without changes']:
+            start = time.perf_counter()
+            extractor.sync_catalog()
+            elapsed = time.perf_counter() - start
+            logger.info('[Benchmark] catalog {}: {} files in {:.2f}s'.format(name, count_files, elapsed))
+
+        # the images with their sizes and modification times, e.g. for the caches of create_training_data
+        methods = [('directory listing', lambda: list_images_with_stats(category_dir)),
+                   ('catalog query', lambda: natsorted(extractor.catalog.get_images(constants.CATEGORIES[0]),
+                                                       key=lambda row: row['name']))]
+        for name, method in methods:
+            start = time.perf_counter()
+            count = len(method())
+            elapsed = time.perf_counter() - start
+            logger.info('[Benchmark] images of a category with {}: {} files in {:.3f}s'.format(name, count, elapsed))
+
+        # the counts of randomly_delete_images
+        start = time.perf_counter()
+        counts = extractor.catalog.count_images()
+        elapsed = time.perf_counter() - start
+        logger.info('[Benchmark] count of images per category with catalog query: {} files in {:.4f}s'.format(
+            sum(counts.values()), elapsed))
+
+        extractor.catalog.close()
+    finally:
+        shutil.rmtree(working_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+import logging
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import constants
+from Isolator.isolator import Isolator
+from Isolator.isolator_constants_320_240 import IsolatorConstants320240
+from Isolator.isolator_constants_640_480 import IsolatorConstants640480
+
+
+def main():
+    logger = create_logger()
+
+    # compare the nested contour removal with the previous quadratic algorithm
+    benchmark_check_contours(logger, contour_counts=[10, 50, 100, 200, 500])
+
+    # compare the float gradient preprocessing with the integer only preprocessing
+    benchmark_preprocessing(logger, resolutions=[(320, 240), (640, 480)])
+
+    # measure the allocations per frame of the isolator in steady state
+    benchmark_allocations(logger, resolutions=[(320, 240), (640, 480)])
+
+    # compare the full resolution isolation with the downscaled fast isolation
+    benchmark_fast_isolation(logger, resolutions=[(640, 480)], scales=[0.5, 0.75])
+
+    # compare the full search in every frame with the tracking of the previous boxes
+    benchmark_tracking(logger, resolutions=[(320, 240), (640, 480)])
+
+    # compare the contour filters in a python loop with the vectorized filters on frames with a textured background
+    benchmark_find_contours(logger, resolutions=[(320, 240), (640, 480)])
+
+
+def create_synthetic_frame(image_width, image_height, seed=42):
+    # noisy rgb background with three signs per crop band, every sign contains a dark digit
+    # 0: frame, 1: bounding boxes (x, y, w, h) of the digits
+    rng = np.random.RandomState(seed)
+    frame = rng.randint(60, 100, size=(image_height, image_width, 3)).astype(np.uint8)
+    frame = cv2.GaussianBlur(frame, (5, 5), 0)
+
+    if image_width == 640 and image_height == 480:
+        isolator_constants = IsolatorConstants640480
+    else:
+        isolator_constants = IsolatorConstants320240
+
+    scale = image_width / 320
+    sign_width, sign_height = int(36 * scale), int(44 * scale)
+    digit_width, digit_height = int(14 * scale), int(26 * scale)
+    slot_width = (isolator_constants.CROP_WIDTH_END - isolator_constants.CROP_WIDTH_START) // 3
+
+    digit_boxes = []
+    for band_start, band_end in [(isolator_constants.CROP_INFO_HEIGHT_START, isolator_constants.CROP_INFO_HEIGHT_END),
+                                 (isolator_constants.CROP_STOP_HEIGHT_START, isolator_constants.CROP_STOP_HEIGHT_END)]:
+        for slot in range(3):
+            x = isolator_constants.CROP_WIDTH_START + slot * slot_width + int(rng.randint(2, slot_width - sign_width - 2))
+            y = int(rng.randint(band_start + 4, band_end - sign_height - 4))
+            cv2.rectangle(frame, (x, y), (x + sign_width, y + sign_height), (150, 150, 150), -1)
+
+            # render the digit large and squeeze it to the aspect ratio of the signal digits
+            digit = np.full((60, 60), 150, dtype=np.uint8)
+            cv2.putText(digit, str(rng.randint(1, 10)), (8, 52), cv2.FONT_HERSHEY_SIMPLEX, 2, 70, 6, cv2.LINE_AA)
+            ys, xs = np.where(digit != 150)
+            digit = digit[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+            digit = cv2.resize(digit, (digit_width, digit_height), interpolation=cv2.INTER_AREA)
+
+            digit_x = x + (sign_width - digit_width) // 2
+            digit_y = y + (sign_height - digit_height) // 2
+            frame[digit_y:digit_y + digit_height, digit_x:digit_x + digit_width] = digit[:, :, None]
+            digit_boxes.append((digit_x, digit_y, digit_width, digit_height))
+
+    blur_size = int(5 * scale) | 1
+    frame = cv2.GaussianBlur(frame, (blur_size, blur_size), 0)
+
+    return frame, digit_boxes
+
+
+def create_cluttered_frame(image_width, image_height, seed=42, block_size=3, contrast=30):
+    # synthetic frame on a high contrast texture (e.g. gravel next to the track), the signs are kept clear,
+    # the threshold masks contain hundreds of contours per crop
+    # 0: frame, 1: bounding boxes (x, y, w, h) of the digits
+    frame, digit_boxes = create_synthetic_frame(image_width, image_height, seed=seed)
+    rng = np.random.RandomState(seed + 1)
+
+    texture = rng.randint(-contrast, contrast + 1, size=(image_height // block_size + 1,
+                                                         image_width // block_size + 1, 1))
+    texture = np.repeat(np.repeat(texture, block_size, axis=0), block_size, axis=1)[:image_height, :image_width]
+
+    # the margin of the signs around the digits
+    scale = image_width / 320
+    margin_x, margin_y = int(13 * scale), int(11 * scale)
+    for x, y, w, h in digit_boxes:
+        texture[y - margin_y:y + h + margin_y, x - margin_x:x + w + margin_x] = 0
+
+    frame = np.clip(frame.astype(np.int16) + texture, 0, 255).astype(np.uint8)
+
+    return frame, digit_boxes
+
+
+def create_synthetic_sequence(image_width, image_height, count_frames, frames_per_scene=40, seed=42):
+    # the signs slowly move to the right, every frames_per_scene frames a new scene starts
+    sequence = []
+    for index in range(count_frames):
+        if index % frames_per_scene == 0:
+            frame_scene, digit_boxes_scene = create_synthetic_frame(image_width, image_height,
+                                                                    seed=seed + index // frames_per_scene)
+        shift = (index % frames_per_scene) // 3
+        frame = np.roll(frame_scene, shift, axis=1)
+        digit_boxes = [(x + shift, y, w, h) for x, y, w, h in digit_boxes_scene if x + w + shift < image_width]
+        sequence.append((frame, digit_boxes))
+
+    return sequence
+
+
+def create_synthetic_contours(count_contours, image_width=320, image_height=120, seed=42):
+    # random circles, every third circle gets a smaller circle nested inside of it
+    rng = np.random.RandomState(seed)
+    contours = []
+    while len(contours) < count_contours:
+        radius = int(rng.randint(4, 20))
+        center = (int(rng.randint(radius, image_width - radius)), int(rng.randint(radius, image_height - radius)))
+        contours.append(cv2.ellipse2Poly(center, (radius, radius), 0, 0, 360, 5).reshape(-1, 1, 2))
+        if len(contours) % 3 == 0 and len(contours) < count_contours:
+            inner_radius = max(2, radius // 2)
+            contours.append(cv2.ellipse2Poly(center, (inner_radius, inner_radius), 0, 0, 360, 5).reshape(-1, 1, 2))
+
+    return contours
+
+
+def check_contours_quadratic(contours):
+    # the previous algorithm, membership is checked by identity so it runs on any input
+    contours_removed = []
+    for i_cnt, cnt in enumerate(contours):
+        for i_cnt2, cnt2 in enumerate(contours):
+            if cnt is not cnt2 and not any(cnt is c for c in contours_removed) and \
+                    not any(cnt2 is c for c in contours_removed):
+                x, y, w, h = cv2.boundingRect(cnt2)
+                center_x = x + int(w / 2)
+                center_y = y + int(h / 2)
+
+                dist_center = cv2.pointPolygonTest(cnt, (center_x, center_y), False)
+
+                if dist_center > -1:
+                    if cv2.contourArea(cnt) > cv2.contourArea(cnt2):
+                        del contours[i_cnt2]
+                        contours_removed.append(cnt2)
+                    else:
+                        del contours[i_cnt]
+                        contours_removed.append(cnt)
+
+    return contours
+
+
+def time_function(function, repeats):
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    return np.array(times) * 1000, result
+
+
+def benchmark_check_contours(logger, contour_counts, repeats=5):
+    isolator = Isolator()
+
+    for count_contours in contour_counts:
+        contours = create_synthetic_contours(count_contours)
+
+        times_quadratic, kept_quadratic = time_function(lambda: check_contours_quadratic(list(contours)), repeats)
+        times_indexed, kept_indexed = time_function(lambda: isolator._Isolator__check_countours(list(contours)),
+                                                    repeats)
+
+        logger.info('[check contours] contours: {:4d}, quadratic: {:8.2f}ms ({} kept), '
+                    'indexed: {:8.2f}ms ({} kept), speedup: {:.1f}x'.format(count_contours,
+                                                                            np.median(times_quadratic),
+                                                                            len(kept_quadratic),
+                                                                            np.median(times_indexed),
+                                                                            len(kept_indexed),
+                                                                            np.median(times_quadratic) /
+                                                                            np.median(times_indexed)))
+
+
+def find_contours_loop(isolator, image):
+    # the previous contour filters, the hierarchy, statistics and filters of every contour are checked in a python loop
+    image_height, image_width = image.shape
+    _, contours, hierarchy = cv2.findContours(image, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+    contours_kept = []
+    for i, cnt in enumerate(contours):
+        if (hierarchy[0][i][3] != -1 and hierarchy[0][i][2] == -1) or \
+                (hierarchy[0][i][3] == -1 and hierarchy[0][i][2] > 0) or \
+                (hierarchy[0][i][3] > 0 and hierarchy[0][i][2] > 0):
+            if isolator.CONSTANTS.AREA_SIZE_MIN < cv2.contourArea(cnt) < isolator.CONSTANTS.AREA_SIZE_MAX:
+                x, y, w, h = cv2.boundingRect(cnt)
+                if w < isolator.CONSTANTS.WIDTH_MAX and h < isolator.CONSTANTS.HEIGHT_MAX:
+                    if isolator.CONSTANTS.WIDTH_HEIGHT_RATIO_MIN < w / h < isolator.CONSTANTS.WIDTH_HEIGHT_RATIO_MAX:
+                        if y > 0 and x > 0 and y + h < image_height and x + w < image_width:
+                            region_of_interest = image[y:y + h, x:x + w]
+                            anz_pixel = w * h
+                            anz_pixel_black = anz_pixel - np.sum(region_of_interest == 255)
+                            anz_pixel_black_ratio = (anz_pixel_black / anz_pixel) * 100
+                            if isolator.CONSTANTS.PIXEL_RATIO_MIN < anz_pixel_black_ratio < \
+                                    isolator.CONSTANTS.PIXEL_RATIO_MAX:
+                                contours_kept.append(cnt)
+
+    return contours_kept
+
+
+def benchmark_find_contours(logger, resolutions, count_frames=20, repeats=10):
+    for image_width, image_height in resolutions:
+        isolator = Isolator()
+
+        masks = []
+        count_rois = 0
+        for seed in range(count_frames):
+            frame, _ = create_cluttered_frame(image_width, image_height, seed=seed)
+            count_rois += len(isolator.get_regions_of_interest(frame))
+
+            image = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY) if constants.USE_GRAY_SCALE else frame
+            isolator._Isolator__set_constants(image)
+            for crop in isolator._Isolator__crop(image):
+                if constants.USE_FAST_PREPROCESSING:
+                    mask = isolator._Isolator__threshold_gradient(crop)[0]
+                else:
+                    mask = isolator._Isolator__threshold(isolator._Isolator__preprocess(crop)[0])
+                masks.append(mask.copy())
+
+        count_contours = sum(len(cv2.findContours(mask.copy(), cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)[1])
+                             for mask in masks)
+
+        # the contour detection itself is the same in both, only the filters differ
+        times_detection, _ = time_function(lambda: [cv2.findContours(mask.copy(), cv2.RETR_CCOMP,
+                                                                     cv2.CHAIN_APPROX_NONE) for mask in masks], repeats)
+        times_loop, kept_loop = time_function(lambda: [find_contours_loop(isolator, mask.copy())
+                                                       for mask in masks], repeats)
+        times_vectorized, kept_vectorized = time_function(lambda: [isolator._Isolator__find_contours(mask.copy())
+                                                                   for mask in masks], repeats)
+
+        same_contours = all(len(contours_loop) == len(contours_vectorized) and
+                            all(np.array_equal(cnt_loop, cnt_vectorized)
+                                for cnt_loop, cnt_vectorized in zip(contours_loop, contours_vectorized))
+                            for contours_loop, contours_vectorized in zip(kept_loop, kept_vectorized))
+
+        logger.info('[find contours] {}x{}, contours per crop: {:.0f}, loop: {:.3f}ms, vectorized: {:.3f}ms per crop '
+                    '(of which cv2.findContours: {:.3f}ms), speedup: {:.1f}x, same contours: {}, '
+                    'rois per frame: {:.1f}'.format(image_width, image_height, count_contours / len(masks),
+                                                    np.median(times_loop) / len(masks),
+                                                    np.median(times_vectorized) / len(masks),
+                                                    np.median(times_detection) / len(masks),
+                                                    np.median(times_loop) / np.median(times_vectorized),
+                                                    same_contours, count_rois / count_frames))
+
+
+def benchmark_preprocessing(logger, resolutions, count_frames=10, repeats=20):
+    for image_width, image_height in resolutions:
+        isolator = Isolator()
+
+        crops = []
+        for seed in range(count_frames):
+            frame, _ = create_synthetic_frame(image_width, image_height, seed=seed)
+            image = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY) if constants.USE_GRAY_SCALE else frame
+            isolator._Isolator__set_constants(image)
+            crops.extend(isolator._Isolator__crop(image))
+
+        def preprocess_float():
+            return [isolator._Isolator__threshold(isolator._Isolator__preprocess(crop)[0]).copy() for crop in crops]
+
+        def preprocess_integer():
+            return [isolator._Isolator__threshold_gradient(crop)[0].copy() for crop in crops]
+
+        times_float, masks_float = time_function(preprocess_float, repeats)
+        times_integer, masks_integer = time_function(preprocess_integer, repeats)
+
+        count_pixels = sum(mask.size for mask in masks_float)
+        count_different = sum(int(np.count_nonzero(mask_float != mask_integer))
+                              for mask_float, mask_integer in zip(masks_float, masks_integer))
+
+        logger.info('[preprocessing] {}x{}, float: {:.3f}ms, integer: {:.3f}ms per crop, speedup: {:.1f}x, '
+                    'different mask pixels: {} of {}'.format(image_width, image_height,
+                                                             np.median(times_float) / len(crops),
+                                                             np.median(times_integer) / len(crops),
+                                                             np.median(times_float) / np.median(times_integer),
+                                                             count_different, count_pixels))
+
+
+def benchmark_allocations(logger, resolutions, count_frames=20):
+    for image_width, image_height in resolutions:
+        frames = [create_synthetic_frame(image_width, image_height, seed=seed)[0] for seed in range(count_frames)]
+
+        for return_views in [False, True]:
+            isolator = Isolator()
+            # warm up, so that the work buffers are allocated
+            isolator.get_regions_of_interest(frames[0], return_views=return_views)
+
+            allocated_per_frame = []
+            tracemalloc.start()
+            for frame in frames:
+                # clearing the traces also resets the peak, the peak is then the memory allocated in this frame
+                tracemalloc.clear_traces()
+                isolator.get_regions_of_interest(frame, return_views=return_views)
+                _, peak = tracemalloc.get_traced_memory()
+                allocated_per_frame.append(peak)
+            tracemalloc.stop()
+
+            logger.info('[allocations] {}x{}, views: {}, allocated per frame: median {:.1f}KB, max {:.1f}KB, '
+                        'pooled buffers: {:.1f}KB'.format(image_width, image_height, return_views,
+                                                          np.median(allocated_per_frame) / 1024,
+                                                          np.max(allocated_per_frame) / 1024,
+                                                          isolator.buffer_pool.size_in_bytes() / 1024))
+
+
+def intersection_over_union(box_1, box_2):
+    x_1, y_1, w_1, h_1 = box_1
+    x_2, y_2, w_2, h_2 = box_2
+    intersection_w = max(0, min(x_1 + w_1, x_2 + w_2) - max(x_1, x_2))
+    intersection_h = max(0, min(y_1 + h_1, y_2 + h_2) - max(y_1, y_2))
+    intersection = intersection_w * intersection_h
+
+    return intersection / float(w_1 * h_1 + w_2 * h_2 - intersection)
+
+
+def detect_boxes(isolator, frame):
+    # bounding boxes of the accepted contours in frame coordinates
+    boxes = []
+    contours_signal_type = isolator.get_contours_and_rois(frame)
+    offsets = [isolator.CONSTANTS.CROP_INFO_HEIGHT_START, isolator.CONSTANTS.CROP_STOP_HEIGHT_START]
+    for (contours, _, _), offset_y in zip(contours_signal_type, offsets):
+        for cnt in contours if contours is not None else []:
+            x, y, w, h = cv2.boundingRect(cnt)
+            boxes.append((x + isolator.CONSTANTS.CROP_WIDTH_START, y + offset_y, w, h))
+
+    return boxes
+
+
+def evaluate_isolation(isolator, frames, min_intersection_over_union=0.5):
+    # 0: recall of the digit boxes, 1: count of detected boxes, 2: times per frame in ms
+    count_found = 0
+    count_digits = 0
+    count_boxes = 0
+    times = []
+    for frame, digit_boxes in frames:
+        start = time.perf_counter()
+        boxes = detect_boxes(isolator, frame)
+        times.append((time.perf_counter() - start) * 1000)
+
+        count_boxes += len(boxes)
+        count_digits += len(digit_boxes)
+        for digit_box in digit_boxes:
+            if any(intersection_over_union(digit_box, box) >= min_intersection_over_union for box in boxes):
+                count_found += 1
+
+    return count_found / float(max(count_digits, 1)), count_boxes, np.array(times)
+
+
+def benchmark_fast_isolation(logger, resolutions, scales, count_frames=50):
+    use_fast_isolation = constants.USE_FAST_ISOLATION
+    fast_isolation_scale = constants.FAST_ISOLATION_SCALE
+
+    try:
+        for image_width, image_height in resolutions:
+            frames = [create_synthetic_frame(image_width, image_height, seed=seed) for seed in range(count_frames)]
+
+            constants.USE_FAST_ISOLATION = False
+            recall, count_boxes, times = evaluate_isolation(Isolator(), frames)
+            logger.info('[fast isolation] {}x{}, full resolution: {:.2f}ms ({:.0f} fps), recall: {:.3f}, '
+                        'boxes: {}'.format(image_width, image_height, np.median(times), 1000 / np.mean(times),
+                                           recall, count_boxes))
+
+            constants.USE_FAST_ISOLATION = True
+            for scale in scales:
+                constants.FAST_ISOLATION_SCALE = scale
+                recall, count_boxes, times = evaluate_isolation(Isolator(), frames)
+                logger.info('[fast isolation] {}x{}, scale {:.2f}: {:.2f}ms ({:.0f} fps), recall: {:.3f}, '
+                            'boxes: {}'.format(image_width, image_height, scale, np.median(times),
+                                               1000 / np.mean(times), recall, count_boxes))
+    finally:
+        constants.USE_FAST_ISOLATION = use_fast_isolation
+        constants.FAST_ISOLATION_SCALE = fast_isolation_scale
+
+
+def benchmark_tracking(logger, resolutions, count_frames=200, repeats=5):
+    for image_width, image_height in resolutions:
+        sequence = create_synthetic_sequence(image_width, image_height, count_frames)
+
+        recall_full, _, _ = evaluate_isolation(Isolator(use_tracking=False), sequence)
+        recall_tracked, _, _ = evaluate_isolation(Isolator(use_tracking=True), sequence)
+
+        # the time saved is measured against an isolator without tracking, both isolate every frame right
+        # after each other, so that a slower period of the machine hits both
+        isolator_full = Isolator(use_tracking=False)
+        isolator_tracked = Isolator(use_tracking=True)
+        times_full = []
+        times_tracked = []
+        for _ in range(repeats):
+            for frame, _ in sequence:
+                start = time.perf_counter()
+                detect_boxes(isolator_full, frame)
+                times_full.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                detect_boxes(isolator_tracked, frame)
+                times_tracked.append((time.perf_counter() - start) * 1000)
+        statistics = isolator_tracked.tracker.get_statistics()
+        time_full = np.mean(times_full)
+        time_tracked = np.mean(times_tracked)
+
+        logger.info('[tracking] {}x{}, without tracking: {:.2f}ms (recall {:.3f}), with tracking: {:.2f}ms '
+                    '(recall {:.3f}), saved: {:.2f}ms per frame ({:.1%}), tracked frames: {:.1%}, '
+                    'window: {:.1%} of the band'.format(image_width, image_height, time_full, recall_full,
+                                                        time_tracked, recall_tracked, time_full - time_tracked,
+                                                        (time_full - time_tracked) / time_full,
+                                                        statistics['tracked_fraction'],
+                                                        statistics['mean_window_fraction']))
+
+
+def create_logger():
+    logger = logging.getLogger('Benchmark')
+    logger.setLevel(constants.LOG_LEVEL)
+    ch = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ch.setFormatter(formatter)
+    logger.addHandler(ch)
+
+    return logger
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+import constants
+from Benchmark.benchmark_isolator import create_logger, create_synthetic_frame
+from Isolator.isolator import Isolator
+from Tester.numpy_model import NumpyModel
+
+MODEL_CLASSES = ['ModelGNetLight', 'ModelGNetLightV2', 'ModelGNetDeep', 'ModelGNetDeepV2', 'ModelGNetDeepV3',
+                 'ModelGNetDeepDeep']
+# a stage only counts as regression if it is slower by the tolerance and by at least this time
+REGRESSION_MIN_MS = 0.02
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times every stage of the isolator and the classifiers')
+    parser.add_argument('--output', default='benchmark_stages.json', help='json file for the results')
+    parser.add_argument('--baseline', default=None, help='json file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown of p50 and p95, 0.1 = 10%%')
+    parser.add_argument('--frames', default=None, help='folder with frames instead of the synthetic frames')
+    parser.add_argument('--count-frames', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    logger = create_logger()
+
+    results = run_benchmark(logger, resolutions=[(320, 240), (640, 480)], frames_folder=args.frames,
+                            count_frames=args.count_frames, repeats=args.repeats)
+    save_results(results, args.output)
+    logger.info('Saved results to: {}'.format(args.output))
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_results(logger, baseline, results, args.tolerance)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+def load_frames(folder_name, image_width, image_height, count_frames):
+    # frames of a folder, resized to the resolution of the benchmark
+    frames = []
+    for f in sorted(os.listdir(folder_name))[:count_frames]:
+        frame = cv2.imread(os.path.join(folder_name, f))
+        if frame is not None:
+            frame = cv2.resize(frame, (image_width, image_height), interpolation=cv2.INTER_AREA)
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    return frames
+
+
+def summarize(times):
+    times = np.asarray(times) * 1000
+    return {'count': int(len(times)),
+            'mean': float(np.mean(times)),
+            'p50': float(np.percentile(times, 50)),
+            'p95': float(np.percentile(times, 95)),
+            'p99': float(np.percentile(times, 99))}
+
+
+def time_stage(stage_times, name, function, repeats):
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        stage_times.setdefault(name, []).append(time.perf_counter() - start)
+
+    return result
+
+
+def time_isolator_stages(isolator, frame, stage_times, repeats):
+    # calls the stages of Isolator.get_regions_of_interest one by one (without fast isolation and tracking)
+    image = frame
+    if constants.USE_GRAY_SCALE:
+        image = time_stage(stage_times, 'color_conversion', lambda: isolator._Isolator__convert_to_gray(frame),
+                           repeats)
+    if isolator.CONSTANTS is None:
+        isolator._Isolator__set_constants(image)
+    isolator.buffer_key = (image.shape, isolator.CONSTANTS)
+
+    cropped_images = time_stage(stage_times, 'crop', lambda: isolator._Isolator__crop(image), repeats)
+
+    rois = []
+    for cropped in cropped_images:
+        magnitude = isolator._Isolator__buffer('magnitude', cropped.shape[:2], np.float32)
+        if constants.USE_GRAY_SCALE:
+            time_stage(stage_times, 'detect_edges', lambda: isolator._Isolator__detect_edges(cropped, magnitude),
+                       repeats)
+
+        # the preprocessing includes the edge detection
+        if constants.USE_FAST_PREPROCESSING:
+            threshold_image, _ = time_stage(stage_times, 'threshold_gradient',
+                                            lambda: isolator._Isolator__threshold_gradient(cropped), repeats)
+        else:
+            preprocessed_image, _ = time_stage(stage_times, 'preprocess',
+                                               lambda: isolator._Isolator__preprocess(cropped), repeats)
+            threshold_image = time_stage(stage_times, 'threshold',
+                                         lambda: isolator._Isolator__threshold(preprocessed_image), repeats)
+
+        contours = time_stage(stage_times, 'find_contours',
+                              lambda: isolator._Isolator__find_contours(threshold_image), repeats)
+        contours = time_stage(stage_times, 'check_contours',
+                              lambda: isolator._Isolator__check_countours(list(contours)), repeats)
+        rois.extend(time_stage(stage_times, 'crop_rois',
+                               lambda: isolator._Isolator__crop_regions_of_interest(cropped, contours), repeats))
+
+    batch = time_stage(stage_times, 'resize', lambda: isolator.reshape_images_for_input(rois), repeats)
+
+    # the whole isolation of the frame, for the comparison with the sum of the stages
+    time_stage(stage_times, 'isolator_total', lambda: isolator.get_regions_of_interest(frame), repeats)
+
+    return batch
+
+
+def create_predict_functions(logger, model_dir):
+    # 0: name of the stage, 1: predict function, the models are created without weights if there are none
+    predict_functions = []
+    try:
+        from Trainer.Models import model_gnet_light, model_gnet_light_v2, model_gnet_deep, model_gnet_deep_v2, \
+            model_gnet_deep_v3, model_gnet_deep_deep
+    # e.g. no or an incompatible tensorflow, the isolator stages are timed anyway
+    except Exception as e:
+        logger.warning('[stages] predict of the keras models skipped ({}: {})'.format(type(e).__name__, e))
+        return predict_functions
+
+    modules = [model_gnet_light, model_gnet_light_v2, model_gnet_deep, model_gnet_deep_v2, model_gnet_deep_v3,
+               model_gnet_deep_deep]
+    for module, class_name in zip(modules, MODEL_CLASSES):
+        model_obj = getattr(module, class_name)('benchmark', inference_only=True)
+        model_obj.create_model()
+        predict_functions.append(['predict_keras_{}'.format(class_name), model_obj.model.predict])
+
+        # the same architecture in the numpy runtime
+        model_path = os.path.join(model_dir, '{}.h5'.format(class_name))
+        model_obj.model.save(model_path)
+        predict_functions.append(['predict_numpy_{}'.format(class_name), NumpyModel(model_path).predict])
+
+    return predict_functions
+
+
+def run_benchmark(logger, resolutions, frames_folder=None, count_frames=20, repeats=10):
+    results = {'meta': {'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'opencv': cv2.__version__,
+                        'machine': platform.machine(),
+                        'processor': platform.processor(),
+                        'use_gray_scale': constants.USE_GRAY_SCALE,
+                        'use_fast_preprocessing': constants.USE_FAST_PREPROCESSING,
+                        'count_frames': count_frames,
+                        'repeats': repeats},
+               'results': {}}
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        predict_functions = create_predict_functions(logger, model_dir)
+
+        for image_width, image_height in resolutions:
+            if frames_folder is not None:
+                frames = load_frames(frames_folder, image_width, image_height, count_frames)
+            else:
+                frames = [create_synthetic_frame(image_width, image_height, seed=seed)[0]
+                          for seed in range(count_frames)]
+
+            isolator = Isolator()
+            # warm up, so that the work buffers are allocated
+            isolator.get_regions_of_interest(frames[0])
+
+            stage_times = {}
+            count_rois = 0
+            for frame in frames:
+                batch = time_isolator_stages(isolator, frame, stage_times, repeats)
+                count_rois += len(batch)
+
+                if len(batch) > 0:
+                    for name, predict in predict_functions:
+                        time_stage(stage_times, name, lambda: predict(batch, batch_size=len(batch)), repeats)
+
+            resolution = '{}x{}'.format(image_width, image_height)
+            results['results'][resolution] = dict((name, summarize(times)) for name, times in stage_times.items())
+            results['meta']['rois_per_frame_{}'.format(resolution)] = count_rois / len(frames)
+
+            log_results(logger, resolution, results['results'][resolution])
+
+    return results
+
+
+def log_results(logger, resolution, stages):
+    for name, summary in stages.items():
+        logger.info('[stages] {} {:<40s} p50 {:8.3f}ms, p95 {:8.3f}ms, p99 {:8.3f}ms'.format(
+            resolution, name, summary['p50'], summary['p95'], summary['p99']))
+
+
+def save_results(results, output_path):
+    with open(output_path, 'w') as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+def compare_results(logger, baseline, results, tolerance=0.1):
+    # 0: resolution, 1: stage, 2: percentile, 3: baseline in ms, 4: result in ms
+    regressions = []
+    for resolution, stages in results['results'].items():
+        stages_baseline = baseline['results'].get(resolution, {})
+        for name, summary in stages.items():
+            if name not in stages_baseline:
+                logger.info('[baseline] {} {}: not in baseline'.format(resolution, name))
+                continue
+
+            for percentile in ['p50', 'p95']:
+                time_baseline = stages_baseline[name][percentile]
+                time_result = summary[percentile]
+                change = (time_result - time_baseline) / time_baseline if time_baseline > 0 else 0
+                if change > tolerance and time_result - time_baseline > REGRESSION_MIN_MS:
+                    regressions.append([resolution, name, percentile, time_baseline, time_result])
+                    logger.warning('[baseline] {} {} {}: {:.3f}ms -> {:.3f}ms ({:+.1%}) regression'.format(
+                        resolution, name, percentile, time_baseline, time_result, change))
+                else:
+                    logger.info('[baseline] {} {} {}: {:.3f}ms -> {:.3f}ms ({:+.1%})'.format(
+                        resolution, name, percentile, time_baseline, time_result, change))
+
+    logger.info('[baseline] {} regressions'.format(len(regressions)))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+import multiprocessing
+import resource
+import time
+import cv2
+import numpy as np
+from Tester.tester import Tester
+from Trainer.Models.model_gnet_deep_v2 import ModelGNetDeepV2
+
+
+MODEL_NAME = 'CNN-gnet-deep-v2-ultimate-data-15-epochs'
+
+
+def main():
+    tester = Tester(ModelGNetDeepV2('GNet', inference_only=True), MODEL_NAME)
+
+    # compare the start up of the tester with and without loading the training data
+    benchmark_cold_start(tester.logger, MODEL_NAME)
+
+    # compare the per roi classification with the batched classification on a folder of frames
+    benchmark_batched_classification(tester, 'continuous')
+
+
+def create_tester_timed(inference_only, model_name, results):
+    start = time.perf_counter()
+    Tester(ModelGNetDeepV2('GNet', inference_only=inference_only), model_name)
+    elapsed = time.perf_counter() - start
+
+    # peak resident memory of the process in KB (linux)
+    results.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def benchmark_cold_start(logger, model_name, repeats=3):
+    # every tester is created in a new process, so that nothing is cached from a previous run
+    context = multiprocessing.get_context('spawn')
+
+    for inference_only in [False, True]:
+        times = []
+        peak_memory = []
+        for _ in range(repeats):
+            results = context.Queue()
+            process = context.Process(target=create_tester_timed, args=(inference_only, model_name, results))
+            process.start()
+            elapsed, max_rss = results.get()
+            process.join()
+
+            times.append(elapsed * 1000)
+            peak_memory.append(max_rss / 1024)
+
+        logger.info('[Benchmark] cold start, inference only: {}, mean {:.0f}ms, min {:.0f}ms, '
+                    'peak memory {:.0f}MB'.format(inference_only, np.mean(times), np.min(times),
+                                                  np.mean(peak_memory)))
+
+
+def load_frames(folder_name):
+    frames = []
+
+    folder_path = os.path.join(os.getcwd(), folder_name)
+    listdir = sorted(os.listdir(folder_path))
+    for f in listdir:
+        frame = cv2.imread(os.path.join(folder_path, f))
+        if frame is not None:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    return frames
+
+
+def classify_per_roi(tester, contours_signal_type):
+    # the previous classification, one predict call per roi
+    predictions_signal_type = []
+    for contour_arr in contours_signal_type:
+        if contour_arr[0] is not None:
+            predictions = []
+            for roi in contour_arr[1]:
+                roi_processed = tester.isolator.reshape_image_for_input(roi)
+                predictions.append(tester.model.predict([roi_processed])[0])
+            predictions_signal_type.append(np.array(predictions))
+        else:
+            predictions_signal_type.append(None)
+
+    return predictions_signal_type
+
+
+def benchmark_batched_classification(tester, folder_name, repeats=5):
+    frames = load_frames(folder_name)
+
+    times_per_roi = []
+    times_batched = []
+    count_rois = []
+    count_mismatches = 0
+
+    for frame in frames:
+        contours_signal_type = tester.isolator.get_contours_and_rois(frame)
+        count_rois.append(sum(len(c[0]) for c in contours_signal_type if c[0] is not None))
+
+        # warm up both paths, so that the first keras call is not measured
+        predictions_per_roi = classify_per_roi(tester, contours_signal_type)
+        predictions_batched = tester.classify_contours_and_rois(contours_signal_type)
+
+        for per_roi, batched in zip(predictions_per_roi, predictions_batched):
+            if per_roi is not None and not np.array_equal(per_roi.argmax(axis=1), batched.argmax(axis=1)):
+                count_mismatches += 1
+
+        for _ in range(repeats):
+            start = time.perf_counter()
+            classify_per_roi(tester, contours_signal_type)
+            times_per_roi.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            tester.classify_contours_and_rois(contours_signal_type)
+            times_batched.append(time.perf_counter() - start)
+
+    if len(frames) == 0:
+        tester.logger.warning('No frames found in folder {}'.format(folder_name))
+        return
+
+    times_per_roi = np.array(times_per_roi) * 1000
+    times_batched = np.array(times_batched) * 1000
+
+    tester.logger.info('[Benchmark] frames: {}, rois per frame: {:.1f} (max {})'.format(len(frames),
+                                                                                       np.mean(count_rois),
+                                                                                       np.max(count_rois)))
+    tester.logger.info('[Benchmark] per roi: mean {:.2f}ms, p50 {:.2f}ms, p95 {:.2f}ms'.format(
+        np.mean(times_per_roi), np.percentile(times_per_roi, 50), np.percentile(times_per_roi, 95)))
+    tester.logger.info('[Benchmark] batched: mean {:.2f}ms, p50 {:.2f}ms, p95 {:.2f}ms'.format(
+        np.mean(times_batched), np.percentile(times_batched, 50), np.percentile(times_batched, 95)))
+    tester.logger.info('[Benchmark] speedup: {:.2f}x, frames with different labels: {}'.format(
+        np.mean(times_per_roi) / np.mean(times_batched), count_mismatches))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+# border modes of the keras fill modes
+FILL_MODES = {
+    'reflect': cv2.BORDER_REFLECT,
+    'nearest': cv2.BORDER_REPLICATE,
+    'wrap': cv2.BORDER_WRAP,
+    'constant': cv2.BORDER_CONSTANT
+}
+
+
+class BatchAugmenter:
+
+    def __init__(self, rotation_range=15, width_shift_range=0.1, height_shift_range=0.1, shear_range=0.2,
+                 zoom_range=(0.8, 1.1), brightness_range=(0.5, 1.5), fill_mode='reflect', seed=None):
+        # same parameters as the ImageDataGenerator of the extractor, rotation and shear in degrees
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.zoom_range = zoom_range
+        self.brightness_range = brightness_range
+        self.border_mode = FILL_MODES[fill_mode]
+
+        self.random_state = np.random.RandomState(seed)
+
+    def create_transforms(self, count, height, width, random_state=None):
+        # 0: count, 1: affine matrix (2x3) that maps the output to the input image
+        random_state = random_state or self.random_state
+        theta = np.deg2rad(random_state.uniform(-self.rotation_range, self.rotation_range, count))
+        tx = random_state.uniform(-self.width_shift_range, self.width_shift_range, count) * width
+        ty = random_state.uniform(-self.height_shift_range, self.height_shift_range, count) * height
+        shear = np.deg2rad(random_state.uniform(-self.shear_range, self.shear_range, count))
+        zx = random_state.uniform(self.zoom_range[0], self.zoom_range[1], count)
+        zy = random_state.uniform(self.zoom_range[0], self.zoom_range[1], count)
+
+        # rotation * shear * zoom, around the center of the image
+        cos = np.cos(theta)
+        sin = np.sin(theta)
+        a = cos * zx
+        b = (-sin + cos * np.tan(shear)) * zy
+        c = sin * zx
+        d = (cos + sin * np.tan(shear)) * zy
+
+        cx = (width - 1) / 2
+        cy = (height - 1) / 2
+
+        transforms = np.empty((count, 2, 3), np.float64)
+        transforms[:, 0, 0] = a
+        transforms[:, 0, 1] = b
+        transforms[:, 0, 2] = cx - a * cx - b * cy + tx
+        transforms[:, 1, 0] = c
+        transforms[:, 1, 1] = d
+        transforms[:, 1, 2] = cy - c * cx - d * cy + ty
+
+        return transforms
+
+    def create_brightness(self, count, random_state=None):
+        if self.brightness_range is None:
+            return None
+
+        random_state = random_state or self.random_state
+        return random_state.uniform(self.brightness_range[0], self.brightness_range[1], count)
+
+    def augment(self, images, random_state=None):
+        # images: uint8 array of the shape (count, height, width) or (count, height, width, channels)
+        # random_state: used instead of the own random state, e.g. a seeded one per worker task
+        images = np.asarray(images)
+        count, height, width = images.shape[:3]
+
+        transforms = self.create_transforms(count, height, width, random_state)
+        augmented = np.empty_like(images)
+        # the warps run per image: one cv2.remap over the padded images stacked into one image gives the same
+        # result (within 1 gray level), but the padding and the maps cost as much as the calls it saves,
+        # and remap is limited to 32767 rows
+        for index in range(count):
+            # cv2 drops a single channel axis, so the result is reshaped
+            augmented[index] = cv2.warpAffine(images[index], transforms[index], (width, height),
+                                              flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                              borderMode=self.border_mode).reshape(images.shape[1:])
+
+        # brightness is multiplied for the whole batch at once
+        brightness = self.create_brightness(count, random_state)
+        if brightness is not None:
+            shape = (count,) + (1,) * (images.ndim - 1)
+            scaled = np.multiply(augmented, brightness.reshape(shape).astype(np.float32), dtype=np.float32)
+            np.clip(scaled, 0, 255, out=scaled)
+            np.copyto(augmented, scaled, casting='unsafe')
+
+        return augmented
+
+    def augment_image(self, image, count, random_state=None):
+        # count augmented versions of one image
+        return self.augment(np.repeat(image[np.newaxis], count, axis=0), random_state)
@@ -0,0 +1,156 @@
+import os
+import re
+import sqlite3
+
+# category of the images in the output directory that are not labelled yet
+UNLABELLED = ''
+# 0: name of the column, 1: type of the column
+COLUMNS = [('category', 'TEXT NOT NULL'),
+           ('name', 'TEXT NOT NULL'),
+           # files that are no images are kept, so that their names are not given to images
+           ('is_image', 'INTEGER NOT NULL'),
+           ('size', 'INTEGER'),
+           ('mtime_ns', 'INTEGER'),
+           ('width', 'INTEGER'),
+           ('height', 'INTEGER'),
+           # sha1 of the file, the same as the content hash of the preprocessing cache
+           ('content_hash', 'TEXT'),
+           # extracted, augmented, inverted, random or unknown
+           ('origin', 'TEXT'),
+           # content hash of the image an augmented or inverted image was created from
+           ('parent_hash', 'TEXT'),
+           # name of the frame without extension, like in the names of the extracted rois
+           ('source_frame', 'TEXT'),
+           ('roi_index', 'INTEGER'),
+           ('signal_type', 'TEXT'),
+           # box of the roi in the source frame
+           ('roi_x', 'INTEGER'),
+           ('roi_y', 'INTEGER'),
+           ('roi_width', 'INTEGER'),
+           ('roi_height', 'INTEGER')]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+# the columns an augmented or inverted image takes over from the image it was created from
+SOURCE_COLUMN_NAMES = ['source_frame', 'roi_index', 'signal_type', 'roi_x', 'roi_y', 'roi_width', 'roi_height']
+# 0: suffix of the name, 1: origin of the images created by the extractor
+ORIGIN_SUFFIXES = [('_aug', 'augmented'), ('_inv', 'inverted'), ('_rand', 'random')]
+# name of an extracted roi: <source frame>_<roi index>_<signal type>
+EXTRACTED_NAME = re.compile(r'^(.+)_(\d+)_(\d+)$')
+
+
+def parse_image_name(name, signal_types):
+    # origin and source of an image that was not created through the catalog, from the names given by the extractor
+    stem = os.path.splitext(name)[0]
+    for suffix, origin in ORIGIN_SUFFIXES:
+        if stem.endswith(suffix):
+            return {'origin': origin}
+
+    match = EXTRACTED_NAME.match(stem)
+    if match is None or int(match.group(3)) >= len(signal_types):
+        return {'origin': 'unknown'}
+
+    return {'origin': 'extracted',
+            'source_frame': match.group(1),
+            'roi_index': int(match.group(2)),
+            'signal_type': signal_types[int(match.group(3))]}
+
+
+class Catalog:
+
+    def __init__(self, catalog_path):
+        self.catalog_path = catalog_path
+
+        self.connection = sqlite3.connect(catalog_path)
+        # one writer, a crash loses at most the last transaction
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS images ({}, PRIMARY KEY (category, name))'.format(
+                ', '.join('{} {}'.format(name, column_type) for name, column_type in COLUMNS)))
+            self.connection.execute('CREATE INDEX IF NOT EXISTS images_content_hash ON images (content_hash)')
+
+    def add(self, rows):
+        # rows: dicts with the columns, missing columns are NULL, existing files are replaced
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO images ({}) VALUES ({})'.format(', '.join(COLUMN_NAMES),
+                                                                         ', '.join('?' * len(COLUMN_NAMES))),
+                [tuple(row.get(name) for name in COLUMN_NAMES) for row in rows])
+
+    def get_rows(self, category, columns=COLUMN_NAMES):
+        # rows of all files in the category, also the ones that are no images
+        return self.__select('category = ?', (category,), columns)
+
+    def get_images(self, category, columns=COLUMN_NAMES):
+        # rows of the images in the category, in no particular order
+        return self.__select('category = ? AND is_image = 1', (category,), columns)
+
+    def __select(self, condition, parameters, columns):
+        # only the given columns, the conversion of the values is the slowest part of large queries
+        cursor = self.connection.execute('SELECT {} FROM images WHERE {}'.format(', '.join(columns), condition),
+                                         parameters)
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def get_names(self, category, images_only=True):
+        query = 'SELECT name FROM images WHERE category = ?' + (' AND is_image = 1' if images_only else '')
+        return [row[0] for row in self.connection.execute(query, (category,))]
+
+    def rename(self, category, renames):
+        # renames: (name, new name), first every file gets a temporary name that can not be a file name,
+        # then the new name, so that no name collides
+        with self.connection:
+            self.connection.executemany('UPDATE images SET name = ? WHERE category = ? AND name = ?',
+                                        [('/' + new_name, category, name) for name, new_name in renames])
+            self.connection.execute("UPDATE images SET name = substr(name, 2) WHERE category = ? AND "
+                                    "name LIKE '/%'", (category,))
+
+    def move(self, moves):
+        # moves: (category, name, new category, new name), the other columns are kept, like os.replace a file
+        # with the new name is replaced
+        with self.connection:
+            for category, name, new_category, new_name in moves:
+                self.connection.execute('DELETE FROM images WHERE category = ? AND name = ?',
+                                        (new_category, new_name))
+                self.connection.execute('UPDATE images SET category = ?, name = ? WHERE category = ? AND name = ?',
+                                        (new_category, new_name, category, name))
+
+    def remove(self, category, names):
+        with self.connection:
+            self.connection.executemany('DELETE FROM images WHERE category = ? AND name = ?',
+                                        [(category, name) for name in names])
+
+    def sample(self, category, count):
+        # names of count random images of the category
+        cursor = self.connection.execute('SELECT name FROM images WHERE category = ? AND is_image = 1 '
+                                         'ORDER BY RANDOM() LIMIT ?', (category, count))
+        return [row[0] for row in cursor]
+
+    def count_images(self):
+        # category -> count of images
+        cursor = self.connection.execute('SELECT category, COUNT(*) FROM images WHERE is_image = 1 '
+                                         'GROUP BY category')
+        return dict((row[0], row[1]) for row in cursor)
+
+    def get_statistics(self):
+        # category -> count of images, {origin: count}, {signal type: count}, count of source frames
+        statistics = {}
+        cursor = self.connection.execute('SELECT category, origin, signal_type, COUNT(*) FROM images '
+                                         'WHERE is_image = 1 GROUP BY category, origin, signal_type')
+        for category, origin, signal_type, count in cursor:
+            category_statistics = statistics.setdefault(category, {'images': 0, 'origins': {}, 'signal_types': {},
+                                                                   'source_frames': 0})
+            category_statistics['images'] += count
+            category_statistics['origins'][origin] = category_statistics['origins'].get(origin, 0) + count
+            category_statistics['signal_types'][signal_type] = \
+                category_statistics['signal_types'].get(signal_type, 0) + count
+
+        # a frame with rois in several categories is counted in each of them
+        cursor = self.connection.execute('SELECT category, COUNT(DISTINCT source_frame) FROM images '
+                                         'WHERE is_image = 1 GROUP BY category')
+        for category, count_frames in cursor:
+            statistics[category]['source_frames'] = count_frames
+
+        return statistics
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,105 @@
+import os
+import json
+import pickle
+import numpy as np
+
+HEADER_FILE_NAME = 'header.json'
+IMAGES_FILE_NAME = 'X.npy'
+LABELS_FILE_NAME = 'y.npy'
+FORMAT_VERSION = 1
+
+
+class Dataset:
+
+    def __init__(self, dataset_dir):
+        self.dataset_dir = dataset_dir
+
+        # 0: count, 1: image size, 2: image size, 3: dimension, uint8 in range [0, 255]
+        self.images = None
+        # index of the category of every image
+        self.labels = None
+        self.categories = None
+        self.img_size = None
+        self.dimension = None
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.dataset_dir, HEADER_FILE_NAME))
+
+    def write(self, training_data, categories, img_size, dimension):
+        # training_data is a list of [image, category], the images are written one by one into the memory map
+        if not os.path.exists(self.dataset_dir):
+            os.makedirs(self.dataset_dir)
+
+        # the header is written last and marks the dataset as complete
+        header_path = os.path.join(self.dataset_dir, HEADER_FILE_NAME)
+        if os.path.exists(header_path):
+            os.remove(header_path)
+
+        count = len(training_data)
+        category_indices = {category: index for index, category in enumerate(categories)}
+
+        images = np.lib.format.open_memmap(os.path.join(self.dataset_dir, IMAGES_FILE_NAME), mode='w+',
+                                           dtype=np.uint8, shape=(count, img_size, img_size, dimension))
+        labels = np.empty(count, np.int32)
+        for index, (features, category) in enumerate(training_data):
+            images[index] = np.reshape(features, (img_size, img_size, dimension))
+            labels[index] = category_indices[category]
+        images.flush()
+        del images
+
+        np.save(os.path.join(self.dataset_dir, LABELS_FILE_NAME), labels)
+
+        header = {'version': FORMAT_VERSION,
+                  'count': count,
+                  'categories': list(categories),
+                  'img_size': img_size,
+                  'dimension': dimension}
+        with open(header_path, 'w') as header_file:
+            json.dump(header, header_file, indent=2)
+
+    def read(self, mmap_mode='r'):
+        with open(os.path.join(self.dataset_dir, HEADER_FILE_NAME)) as header_file:
+            header = json.load(header_file)
+
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError('unsupported dataset version {} in {}'.format(header['version'], self.dataset_dir))
+
+        self.categories = header['categories']
+        self.img_size = header['img_size']
+        self.dimension = header['dimension']
+
+        # with mmap_mode set nothing is loaded until the images are accessed
+        self.images = np.load(os.path.join(self.dataset_dir, IMAGES_FILE_NAME), mmap_mode=mmap_mode)
+        self.labels = np.load(os.path.join(self.dataset_dir, LABELS_FILE_NAME))
+
+        expected_shape = (header['count'], self.img_size, self.img_size, self.dimension)
+        if self.images.shape != expected_shape or self.images.dtype != np.uint8 or \
+                self.labels.shape != (header['count'],):
+            raise ValueError('dataset in {} does not match its header'.format(self.dataset_dir))
+
+        return self
+
+    def split(self, validation_split, random_state=42):
+        # only needed for the training, importing sklearn takes seconds
+        from sklearn.model_selection import train_test_split
+
+        # train test split on the indices, so that the whole dataset is not copied
+        (train_indices, test_indices) = train_test_split(np.arange(len(self.labels)), test_size=validation_split,
+                                                         random_state=random_state)
+        # sorted indices read the memory map sequentially
+        return np.sort(train_indices), np.sort(test_indices)
+
+    def get_label_names(self, indices=None):
+        if indices is None:
+            indices = self.labels
+
+        return np.asarray(self.categories)[indices]
+
+    def convert_pickles(self, x_pickle_path, y_pickle_path, categories, img_size, dimension):
+        # converts a dataset of the old format (X.pickle and y.pickle)
+        with open(x_pickle_path, 'rb') as pickle_in:
+            X = pickle.load(pickle_in)
+        with open(y_pickle_path, 'rb') as pickle_in:
+            y = pickle.load(pickle_in)
+
+        self.write(list(zip(X, y)), categories, img_size, dimension)
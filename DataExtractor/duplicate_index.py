@@ -0,0 +1,126 @@
+import os
+import json
+import cv2
+import numpy as np
+
+INDEX_FILE_NAME = 'index.json'
+# the difference hash has hash_size * hash_size bits
+HASH_SIZE = 8
+
+
+def compute_difference_hash(image, hash_size=HASH_SIZE):
+    # perceptual hash of a gray image, every bit tells if a pixel is brighter than its left neighbour
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class MultiIndexHash:
+
+    def __init__(self, max_distance, hash_bits=HASH_SIZE * HASH_SIZE):
+        # pigeonhole principle: hashes within max_distance are equal in at least one of max_distance + 1 chunks,
+        # so only the hashes with an equal chunk are compared
+        self.max_distance = max_distance
+        bounds = np.linspace(0, hash_bits, min(max_distance + 1, hash_bits) + 1).astype(int)
+        # 0: shift, 1: mask of every chunk
+        self.chunks = [(int(start), (1 << int(end - start)) - 1) for start, end in zip(bounds[:-1], bounds[1:])]
+        # one table per chunk: value of the chunk -> list of (hash, value)
+        self.tables = [{} for _ in self.chunks]
+        self.count = 0
+
+    def add(self, hash_value, value):
+        item = (hash_value, value)
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            table.setdefault((hash_value >> shift) & mask, []).append(item)
+        self.count += 1
+
+    def find(self, hash_value):
+        # 0: distance, 1: value of the closest hash within max_distance, None if there is none
+        closest = None
+        max_distance = self.max_distance
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            for candidate, value in table.get((hash_value >> shift) & mask, ()):
+                # hamming distance
+                distance = bin(hash_value ^ candidate).count('1')
+                if distance <= max_distance:
+                    closest = (distance, value)
+                    if distance == 0:
+                        return closest
+                    # only closer hashes are searched from now on
+                    max_distance = distance - 1
+
+        return closest
+
+
+class DuplicateIndex:
+
+    def __init__(self, index_dir, hash_size=HASH_SIZE):
+        self.index_dir = index_dir
+        self.hash_size = hash_size
+
+        # path of the image -> 0: size, 1: modification time in ns, 2: difference hash
+        self.entries = {}
+
+        self.count_hits = 0
+        self.count_misses = 0
+
+    def load(self):
+        index_path = os.path.join(self.index_dir, INDEX_FILE_NAME)
+        if not os.path.exists(index_path):
+            return self
+
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+
+        # the hashes of another hash size can not be compared
+        if index['hash_size'] == self.hash_size:
+            self.entries = index['entries']
+
+        return self
+
+    def lookup(self, image_path, file_stat):
+        entry = self.entries.get(image_path)
+        if entry is None or entry[0] != file_stat[0] or entry[1] != file_stat[1]:
+            self.count_misses += 1
+            return None
+
+        self.count_hits += 1
+        return entry[2]
+
+    def add(self, image_path, file_stat, hash_value):
+        self.entries[image_path] = [file_stat[0], file_stat[1], hash_value]
+
+    def find_duplicates(self, image_paths, max_distance):
+        # the images are kept in the given order, an image is a duplicate if a kept image is within max_distance
+        # 0: path of the duplicate, 1: path of the kept image, 2: hamming distance
+        table = MultiIndexHash(max_distance, self.hash_size * self.hash_size)
+        duplicates = []
+        for image_path in image_paths:
+            entry = self.entries.get(image_path)
+            if entry is None:
+                continue
+
+            closest = table.find(entry[2])
+            if closest is not None:
+                duplicates.append([image_path, closest[1], closest[0]])
+            else:
+                table.add(entry[2], image_path)
+
+        return duplicates
+
+    def save(self, image_paths):
+        # only keeps the images that still exist, given by image_paths
+        image_paths = set(image_paths)
+        self.entries = dict((path, entry) for path, entry in self.entries.items() if path in image_paths)
+
+        if not os.path.exists(self.index_dir):
+            os.makedirs(self.index_dir)
+
+        index = {'hash_size': self.hash_size, 'entries': self.entries}
+        # written to a new file first, so that an interrupted save keeps the old index
+        index_path = os.path.join(self.index_dir, INDEX_FILE_NAME)
+        index_path_tmp = os.path.join(self.index_dir, 'index_tmp.json')
+        with open(index_path_tmp, 'w') as index_file:
+            index_file.write(json.dumps(index))
+        os.replace(index_path_tmp, index_path)
@@ -6,6 +6,12 @@ def main():
     # create an instance of the extractor
     extractor = Extractor()
 
+    # if you want to sync the catalog after changing the data by hand (done once on the first operation)
+    # extractor.sync_catalog()
+
+    # if you want to see the count of images, origins and signal types of every category
+    # extractor.get_statistics()
+
     # if you want to rename image names
     extractor.rename_images_in_categories()
 
@@ -13,11 +19,14 @@ def main():
     # extractor.extract_data()
 
     # if you want to categorize images with model
-    # extractor.categorize_with_trained_model(ModelGNetDeepV2('GNet'), 'CNN-gnet-deep-v2-new-big-data')
+    # extractor.categorize_with_trained_model(ModelGNetDeepV2('GNet', inference_only=True), 'CNN-gnet-deep-v2-new-big-data')
 
     # if you want to randomly delete images, so that all categories have the same amount of images
     # extractor.randomly_delete_images(200)
 
+    # if you want to remove near-duplicate images, e.g. of consecutive frames (report only without remove=True)
+    # extractor.remove_duplicates_in_categories(remove=True)
+
     # if you want to generate more data with data augmentation
     extractor.augment_all_categories(20)
 
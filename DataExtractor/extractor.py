@@ -1,15 +1,23 @@
 import logging
+import csv
 import os
-import cv2
 import numpy as np
-import pickle
 import constants
 import random
+import tempfile
 from natsort import natsorted
 from tqdm import tqdm
+from DataExtractor import extractor_tasks
+from DataExtractor.batch_augmenter import BatchAugmenter
+from DataExtractor.catalog import Catalog, UNLABELLED, SOURCE_COLUMN_NAMES, parse_image_name
+from DataExtractor.dataset import Dataset
+from DataExtractor.duplicate_index import DuplicateIndex
+from DataExtractor.parallel_executor import ParallelExecutor
+from DataExtractor.preprocessing_cache import PreprocessingCache
 from Isolator.isolator import Isolator
-from tensorflow.python.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.python.keras.preprocessing.image import array_to_img, img_to_array, load_img
+
+# temporary directory of rename_images_in_categories in the category directory
+RENAMING_DIR_PREFIX = '.renaming_'
 
 
 class Extractor:
@@ -17,18 +25,26 @@ class Extractor:
     def __init__(self):
         os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
 
-        self.image_data_gen = ImageDataGenerator(
+        self.augmenter = BatchAugmenter(
             rotation_range=15,
             width_shift_range=0.1,
             height_shift_range=0.1,
             shear_range=0.2,
             zoom_range=[0.8, 1.1],
             brightness_range=[0.5, 1.5],
-            fill_mode='reflect')
+            fill_mode='reflect',
+            seed=constants.AUGMENTATION_SEED)
 
-        self.isolator = Isolator()
+        self.isolator = Isolator(use_tracking=False)
         self.current_working_dir = os.getcwd()
 
+        # runs the file operations on a thread or process pool
+        self.executor = ParallelExecutor(constants.EXTRACTOR_WORKERS, constants.EXTRACTOR_USE_PROCESSES)
+        # errors of the last run of every operation, 0: file, 1: message
+        self.errors = {}
+        # catalog of the images in the output directory, opened and synced with the directories on first use
+        self.catalog = None
+
         self.training_data = []
 
         self.logger = None
@@ -45,29 +61,21 @@ class Extractor:
 
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
+        catalog = self.__get_catalog()
 
         list_dir = os.listdir(input_dir)
         list_dir = natsorted(list_dir)
 
-        for image in tqdm(list_dir):
-            image_name = image
-            image_name = image_name.partition('.')[0]
-            file_string = self.current_working_dir + '/{:s}/{:s}'.format(constants.INPUT_DATA_DIR, image)
-
-            try:
-                image = cv2.imread(file_string)
-                if image is not None:
-                    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                    regions_of_interest = self.isolator.get_regions_of_interest(image)
+        tasks = [(os.path.join(input_dir, image), output_dir, image.partition('.')[0]) for image in list_dir]
+        results, errors = self.executor.map(extractor_tasks.extract_regions_of_interest, tasks)
+        self.__report_errors('extract_data', [(task[0], message) for task, message in errors])
 
-                    for index, roi_arr in enumerate(regions_of_interest):
-                        roi = roi_arr[0]
-                        roi_type = roi_arr[1]
-                        roi_file_name = output_dir + '/{:s}_{:s}_{:s}.jpg'.format(image_name, str(index), str(roi_type))
-                        cv2.imwrite(roi_file_name, roi)
-
-            except Exception as e:
-                self.logger.error('Error in extracting data: {}'.format(e))
+        # the rois are recorded with their source frame, index, signal type and box
+        rows = [row for result in results if result is not None for row in result]
+        for row in rows:
+            row['category'] = UNLABELLED
+        catalog.add(rows)
+        self.logger.info('Extracted {} regions of interest from {} images'.format(len(rows), len(list_dir)))
 
         self.logger.info('creating folders for sorting rois in categories')
         for category in constants.CATEGORIES:
@@ -75,62 +83,216 @@ class Extractor:
             if not os.path.exists(category_dir):
                 os.makedirs(category_dir)
 
+    def sync_catalog(self):
+        # the operations of the extractor keep the catalog up to date, the directories are only listed here to find
+        # the changes made by hand (e.g. images labelled by moving them into a category)
+        catalog = self.__open_catalog()
+        output_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR)
+        self.logger.info('Syncing catalog {} with {}'.format(catalog.catalog_path, output_dir))
+
+        # 0: category, 1: name, 2: row of the catalog if the file changed, of the files to read
+        files_to_read = []
+        # 0: category, 1: name, 2: size, 3: modification time of the files that are not in the catalog
+        new_files = []
+        # (name, size, modification time) -> row of the catalog without a file
+        missing_rows = {}
+        for category in [UNLABELLED] + constants.CATEGORIES:
+            directory = os.path.join(output_dir, category)
+            stats = {}
+            if os.path.isdir(directory):
+                if category != UNLABELLED:
+                    self.__recover_renaming(directory)
+                for entry in os.scandir(directory):
+                    if entry.is_file():
+                        stat = entry.stat()
+                        stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+            # names of the missing and changed files, only their full rows are read from the catalog
+            names_missing = set()
+            names_changed = set()
+            for row in catalog.get_rows(category, ['name', 'size', 'mtime_ns']):
+                file_stat = stats.pop(row['name'], None)
+                if file_stat is None:
+                    names_missing.add(row['name'])
+                elif file_stat != (row['size'], row['mtime_ns']):
+                    names_changed.add(row['name'])
+            new_files.extend((category, name) + file_stat for name, file_stat in natsorted(stats.items()))
+
+            if len(names_missing) + len(names_changed) > 0:
+                for row in catalog.get_rows(category):
+                    if row['name'] in names_missing:
+                        missing_rows[(row['name'], row['size'], row['mtime_ns'])] = row
+                    elif row['name'] in names_changed:
+                        files_to_read.append((category, row['name'], row))
+
+        # a file that was moved into another category keeps its name, size and modification time
+        moves = []
+        for category, name, size, mtime_ns in new_files:
+            row = missing_rows.pop((name, size, mtime_ns), None)
+            if row is not None:
+                moves.append((row['category'], name, category, name))
+            else:
+                files_to_read.append((category, name, None))
+        catalog.move(moves)
+
+        image_paths = [os.path.join(output_dir, category, name) for category, name, _ in files_to_read]
+        results, errors = self.executor.map(extractor_tasks.read_image_info, image_paths)
+        self.__report_errors('sync_catalog', errors)
+
+        # a new file with the content of a missing row (e.g. renamed by hand) takes over its origin and source
+        missing_rows_by_hash = dict((row['content_hash'], key) for key, row in missing_rows.items()
+                                    if row['content_hash'] is not None)
+        rows = []
+        for (category, name, old_row), row in zip(files_to_read, results):
+            if row is None:
+                continue
+            row['category'] = category
+            if old_row is None and row['content_hash'] in missing_rows_by_hash:
+                # the missing row is removed below
+                old_row = missing_rows[missing_rows_by_hash.pop(row['content_hash'])]
+            if old_row is not None:
+                row['origin'] = old_row['origin']
+                row['parent_hash'] = old_row['parent_hash']
+                row.update((column, old_row[column]) for column in SOURCE_COLUMN_NAMES)
+            else:
+                row.update(parse_image_name(name, constants.SIGNAL_TYPES))
+            rows.append(row)
+        catalog.add(rows)
+
+        # the files were deleted or renamed
+        for row in missing_rows.values():
+            catalog.remove(row['category'], [row['name']])
+
+        self.logger.info('Catalog synced: {} moved, {} read, {} removed'.format(
+            len(moves), len(rows), len(missing_rows)))
+
+    def get_statistics(self):
+        # counts of the catalog per category, without reading the directories
+        statistics = self.__get_catalog().get_statistics()
+        for category in sorted(statistics, key=lambda category: (category != UNLABELLED, category)):
+            category_statistics = statistics[category]
+            self.logger.info('Category {}: {} images from {} frames, origins {}, signal types {}'.format(
+                category if category != UNLABELLED else '(unlabelled)', category_statistics['images'],
+                category_statistics['source_frames'], category_statistics['origins'],
+                category_statistics['signal_types']))
+
+        return statistics
+
+    def __open_catalog(self):
+        # opened on first use, so that current_working_dir can still be changed after the creation
+        if self.catalog is None:
+            self.catalog = Catalog(os.path.join(self.current_working_dir, constants.CATALOG_NAME))
+        return self.catalog
+
+    def __get_catalog(self):
+        # the changes made by hand since the last run are synced once
+        if self.catalog is None:
+            self.sync_catalog()
+        return self.catalog
+
+    def __get_synced_catalog(self):
+        # the operations that write, move or delete files sync every time, so that they see the files added by hand
+        # since the last sync and do not replace them
+        self.sync_catalog()
+        return self.catalog
+
+    @staticmethod
+    def __get_free_name(directory, name):
+        # the name itself if no file in the directory has it, else e.g. 5_recovered.jpg, 5_recovered_1.jpg
+        stem, extension = os.path.splitext(name)
+        free_name = name
+        index = 0
+        while os.path.exists(os.path.join(directory, free_name)):
+            free_name = '{:s}_recovered{:s}{:s}'.format(stem, '_{:d}'.format(index) if index > 0 else '', extension)
+            index += 1
+
+        return free_name
+
     def rename_images_in_categories(self):
         self.logger.info('renaming images in categories')
+        catalog = self.__get_synced_catalog()
 
         for category in constants.CATEGORIES:
             category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
 
-            list_category_dir = os.listdir(category_dir)
-            list_category_dir = natsorted(list_category_dir)
-
-            for index, image in enumerate(tqdm(list_category_dir)):
-                image_path = os.path.join(category_dir, image)
-                image_array = cv2.imread(image_path)
-
-                if image_array is not None:
-                    # remove the loaded image
-                    os.remove(image_path)
-
-                    image_name = '{:s}.jpg'.format(str(index))
-                    image_path = os.path.join(category_dir, image_name)
-                    if not os.path.exists(image_path):
-                        cv2.imwrite(image_path, image_array)
-                    else:
-                        i = index
-                        while True:
-                            i += 1
-                            image_name = '{:s}.jpg'.format(str(i))
-                            image_path = os.path.join(category_dir, image_name)
-                            if not os.path.exists(image_path):
-                                cv2.imwrite(image_path, image_array)
-                                break
+            list_category_dir = natsorted(catalog.get_names(category))
+
+            # files that are no images keep their name, so it is not given to an image
+            names_taken = set(catalog.get_names(category, images_only=False)) - set(list_category_dir)
+            if len(names_taken) > 0:
+                self.logger.warning('{} files in category {} are no images'.format(len(names_taken), category))
+
+            # 0: name of the image, 1: new name, the images keep their extension
+            renames = []
+            index = 0
+            for img in list_category_dir:
+                extension = os.path.splitext(img)[1].lower()
+                while '{:d}{:s}'.format(index, extension) in names_taken:
+                    index += 1
+                new_name = '{:d}{:s}'.format(index, extension)
+                # e.g. the images before the first deleted one, no other image gets their name
+                if new_name != img:
+                    renames.append((img, new_name))
+                index += 1
+
+            # first every image is moved with its new name into an empty directory, then back into the category,
+            # so that no name collides, the files are only renamed and not encoded again
+            renaming_dir = tempfile.mkdtemp(prefix=RENAMING_DIR_PREFIX, dir=category_dir)
+            for img, new_name in renames:
+                os.rename(os.path.join(category_dir, img), os.path.join(renaming_dir, new_name))
+            # a file that was added since the sync keeps its name, the image gets another one
+            renames_done = []
+            for img, new_name in renames:
+                free_name = self.__get_free_name(category_dir, new_name)
+                os.rename(os.path.join(renaming_dir, new_name), os.path.join(category_dir, free_name))
+                renames_done.append((img, free_name))
+            os.rmdir(renaming_dir)
+            catalog.rename(category, renames_done)
+
+            count_diverted = sum(1 for (_, new_name), (_, free_name) in zip(renames, renames_done)
+                                 if new_name != free_name)
+            if count_diverted > 0:
+                self.logger.warning('{} images in category {} got a _recovered name, their new name was taken'.format(
+                    count_diverted, category))
+            self.logger.info('Renamed {} images in category {}'.format(len(renames), category))
+
+    def __recover_renaming(self, category_dir):
+        # moves back the images of an interrupted rename_images_in_categories, they already have their new names,
+        # sync_catalog finds them by their content
+        for renaming_dir in os.listdir(category_dir):
+            if not renaming_dir.startswith(RENAMING_DIR_PREFIX):
+                continue
+
+            renaming_dir = os.path.join(category_dir, renaming_dir)
+            for img in os.listdir(renaming_dir):
+                os.rename(os.path.join(renaming_dir, img),
+                          os.path.join(category_dir, self.__get_free_name(category_dir, img)))
+            os.rmdir(renaming_dir)
+            self.logger.warning('Recovered images of an interrupted renaming in {}'.format(category_dir))
 
     def create_inverse_data(self, category):
         self.logger.info('creating inverse data in category {}'.format(category))
 
         category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
+        catalog = self.__get_synced_catalog()
 
-        list_category_dir = os.listdir(category_dir)
-        list_category_dir = natsorted(list_category_dir)
+        rows = natsorted(catalog.get_images(category), key=lambda row: row['name'])
 
-        for index, image in enumerate(tqdm(list_category_dir)):
-            image_path = os.path.join(category_dir, image)
-            image_array = cv2.imread(image_path)
+        tasks = [(os.path.join(category_dir, row['name']),
+                  os.path.join(category_dir, '{:s}_inv.jpg'.format(str(index)))) for index, row in enumerate(rows)]
+        results, errors = self.executor.map(extractor_tasks.invert_image, tasks)
+        self.__report_errors('create_inverse_data', [(task[0], message) for task, message in errors])
 
-            if image_array is not None:
-                # invert image
-                image_inv = cv2.bitwise_not(image_array)
-
-                image_name = '{:s}_inv.jpg'.format(str(index))
-                image_path = os.path.join(category_dir, image_name)
-                cv2.imwrite(image_path, image_inv)
+        catalog.add([self.__create_derived_row(row, new_row, 'inverted')
+                     for row, new_row in zip(rows, results) if new_row is not None])
 
     def create_random_images(self, category, count):
         self.logger.info('creating random images in category {}'.format(category))
 
         category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
+        catalog = self.__get_synced_catalog()
 
+        rows = []
         for index in tqdm(range(count)):
             if constants.USE_GRAY_SCALE:
                 image_rand = np.random.randint(0, 255, size=(constants.IMG_SIZE, constants.IMG_SIZE), dtype=np.uint8)
@@ -140,160 +302,316 @@ class Extractor:
                                                dtype=np.uint8)
             image_name = '{:s}_rand.jpg'.format(str(index))
             image_path = os.path.join(category_dir, image_name)
-            cv2.imwrite(image_path, image_rand)
+            row = extractor_tasks.write_image(image_path, image_rand)
+            row.update({'category': category, 'origin': 'random'})
+            rows.append(row)
+
+        catalog.add(rows)
 
-    def create_training_data(self):
+    def create_training_data(self, aug_count=0):
+        # aug_count: augmented versions of every image that are added to the training data, without saving them
         self.logger.info('creating training data')
 
+        # preprocessed images of earlier runs, only new or changed files are read again
+        cache = PreprocessingCache(constants.PREPROCESSING_CACHE_DIR,
+                                   {'img_size': constants.IMG_SIZE, 'use_gray_scale': constants.USE_GRAY_SCALE})
+        cache.load()
+        catalog = self.__get_catalog()
+
         self.training_data.clear()
+        errors = []
+        image_paths_all = []
         for category in constants.CATEGORIES:
 
             category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
 
-            list_category_dir = os.listdir(category_dir)
-            list_category_dir = natsorted(list_category_dir)
-
-            for img in tqdm(list_category_dir):
-                try:
-                    img_array = cv2.imread(os.path.join(category_dir, img))
-                    if img_array is not None:
-                        # convert image to grayscale if parameter is set in constants file
-                        if constants.USE_GRAY_SCALE:
-                            img_array = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
-                        # resize to normalize data size
-                        new_array = cv2.resize(img_array, (constants.IMG_SIZE, constants.IMG_SIZE))
-                        # add image to our training data
-                        self.training_data.append([new_array, category])
-                # exceptions are ignored, to keep the output clean
-                except Exception as e:
-                    self.logger.error('Error in creating training data: {}'.format(e))
+            rows = natsorted(catalog.get_images(category, ['name', 'size', 'mtime_ns', 'content_hash']),
+                             key=lambda row: row['name'])
+
+            image_paths = [os.path.join(category_dir, row['name']) for row in rows]
+            image_paths_all.extend(image_paths)
+
+            results = []
+            image_paths_missing = []
+            file_stats_missing = []
+            for row, image_path in zip(rows, image_paths):
+                # the catalog knows the content hash, the files are neither read nor stat'ed
+                file_stat = (row['size'], row['mtime_ns'])
+                new_array = cache.lookup_content(row['content_hash'])
+                results.append(new_array)
+                if new_array is not None:
+                    # keeps the entry of a renamed or moved image in the cache
+                    cache.add(image_path, file_stat, row['content_hash'], new_array)
+                else:
+                    image_paths_missing.append(image_path)
+                    file_stats_missing.append(file_stat)
+
+            if len(image_paths_missing) > 0:
+                results_missing, errors_category = self.executor.map(extractor_tasks.read_training_image_with_hash,
+                                                                     image_paths_missing)
+                errors.extend(errors_category)
+
+                results_missing = iter(zip(image_paths_missing, file_stats_missing, results_missing))
+                for index, new_array in enumerate(results):
+                    if new_array is None:
+                        image_path, file_stat, result = next(results_missing)
+                        if result is not None and result[1] is not None:
+                            cache.add(image_path, file_stat, result[0], result[1])
+                            results[index] = result[1]
+
+            for new_array in results:
+                if new_array is not None:
+                    # add image to our training data
+                    self.training_data.append([new_array, category])
+
+        self.__report_errors('create_training_data', errors)
+
+        self.logger.info('Preprocessed images from cache: {}, read again: {}'.format(cache.count_hits,
+                                                                                    cache.count_misses))
+        # removes deleted images from the cache
+        cache.save(image_paths_all)
+
+        if aug_count > 0:
+            self.__augment_training_data(aug_count)
 
         random.shuffle(self.training_data)
 
         self.__create_model()
 
+    def __augment_training_data(self, aug_count, chunk_size=1024):
+        self.logger.info('Augmenting training data, {} images per image'.format(aug_count))
+
+        count_images = len(self.training_data)
+        for chunk_start in tqdm(range(0, count_images, chunk_size)):
+            chunk = self.training_data[chunk_start:min(chunk_start + chunk_size, count_images)]
+            images = np.repeat(np.stack([features for features, _ in chunk]), aug_count, axis=0)
+
+            augmented_images = self.augmenter.augment(images)
+            for index, new_array in enumerate(augmented_images):
+                self.training_data.append([new_array, chunk[index // aug_count][1]])
+
     def __create_model(self):
         self.logger.info('Creating data model')
 
-        X = []
-        y = []
+        dataset = Dataset(constants.DATASET_DIR)
+        dataset.write(self.training_data, constants.CATEGORIES, constants.IMG_SIZE, constants.DIMENSION)
+
+        self.logger.info('Saved data model to: {}'.format(constants.DATASET_DIR))
 
-        for features, label in self.training_data:
-            X.append(features)
-            y.append(label)
+    def categorize_with_trained_model(self, model_obj, model_name, confidence=constants.CATEGORIZE_CONFIDENCE,
+                                      batch_size=constants.CATEGORIZE_BATCH_SIZE,
+                                      report_name=constants.CATEGORIZE_REPORT_NAME):
+        self.logger.info('Categorizing images')
 
-        X = np.array(X).reshape(-1, constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION)
+        model = model_obj.load_model_for_inference(model_name)
 
-        pickle_out = open('../X.pickle', 'wb')
-        pickle.dump(X, pickle_out)
-        pickle_out.close()
+        extracted_data_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR)
 
-        pickle_out = open('../y.pickle', 'wb')
-        pickle.dump(y, pickle_out)
-        pickle_out.close()
+        list_data_dir = natsorted(self.__get_catalog().get_names(UNLABELLED))
 
-        self.logger.info('Saved data model to root directory')
+        # 0: file, 1: label, 2: confidence, 3: probabilities of all categories
+        predictions_report = []
+        errors = []
+        for batch_start in range(0, len(list_data_dir), batch_size):
+            batch_files = list_data_dir[batch_start:batch_start + batch_size]
 
-    def categorize_with_trained_model(self, model_obj, model_name):
-        self.logger.info('Categorizing images')
+            # decode the images in parallel and classify them with a single predict call
+            image_paths = [os.path.join(extracted_data_dir, img) for img in batch_files]
+            results, errors_batch = self.executor.map(extractor_tasks.read_training_image, image_paths)
+            errors.extend(errors_batch)
+
+            batch_files = [img for img, image_array in zip(batch_files, results) if image_array is not None]
+            if len(batch_files) == 0:
+                continue
+
+            batch = np.stack([image_array for image_array in results if image_array is not None])
+            batch = batch.reshape(-1, constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION)
+            # the model gets the pixels scaled like the training data, like in the tester
+            predictions = model.predict(self.isolator.scale_images_for_input(batch), batch_size=len(batch))
 
-        model_path = '{}{}.h5'.format(constants.MODEL_DIR, model_name)
-        model_obj.create_model(weights_path=model_path)
-        model = model_obj.model
+            for img, prediction in zip(batch_files, predictions):
+                i = prediction.argmax()
+                predictions_report.append([img, constants.CATEGORIES[i], prediction[i], prediction])
+
+        self.__report_errors('categorize_with_trained_model', errors)
+
+        report_path = os.path.join(self.current_working_dir, report_name)
+        self.__write_categorize_report(report_path, predictions_report)
+        self.logger.info('Saved predictions of {} images to: {}'.format(len(predictions_report), report_path))
+
+        self.categorize_with_report(report_path, confidence)
+
+    def categorize_with_report(self, report_path, confidence=constants.CATEGORIZE_CONFIDENCE):
+        # moves the images of a report from categorize_with_trained_model, without running the model again
+        self.logger.info('Categorizing images with report {}, confidence > {}'.format(report_path, confidence))
 
         extracted_data_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR)
+        catalog = self.__get_synced_catalog()
+
+        with open(report_path, newline='') as report_file:
+            rows = list(csv.DictReader(report_file))
+
+        names_unlabelled = set(catalog.get_names(UNLABELLED))
+        moves = []
+        for row in rows:
+            if float(row['confidence']) <= confidence:
+                continue
+
+            # the image was already moved by an earlier run
+            if row['file'] not in names_unlabelled:
+                continue
+
+            category_dir = os.path.join(extracted_data_dir, row['label'])
+            if not os.path.exists(category_dir):
+                os.makedirs(category_dir)
 
-        list_data_dir = os.listdir(extracted_data_dir)
-        list_data_dir = natsorted(list_data_dir)
-
-        for img in tqdm(list_data_dir):
-            try:
-                image_path = os.path.join(extracted_data_dir, img)
-                img_array = cv2.imread(image_path)
-                if img_array is not None:
-                    if constants.USE_GRAY_SCALE:
-                        image_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-                    resized_image_array = cv2.resize(image_array, (constants.IMG_SIZE, constants.IMG_SIZE))
-                    reshaped_image = resized_image_array.reshape(-1, constants.IMG_SIZE, constants.IMG_SIZE,
-                                                                 constants.DIMENSION)
-                    prediction = model.predict([reshaped_image])
-
-                    i = prediction.argmax(axis=1)[0]
-                    label = constants.CATEGORIES[i]
-
-                    if prediction[0][i] > 0.99:
-                        os.remove(image_path)
-                        image_path = os.path.join(extracted_data_dir, label, img)
-                        cv2.imwrite(image_path, image_array)
-
-            # exceptions are ignored, to keep the output clean
-            except Exception as e:
-                self.logger.error('Error in categorizing with trained model: {}'.format(e))
+            # the file is moved, not encoded again, an image of the category with the same name is kept
+            new_name = self.__get_free_name(category_dir, row['file'])
+            os.rename(os.path.join(extracted_data_dir, row['file']), os.path.join(category_dir, new_name))
+            moves.append((UNLABELLED, row['file'], row['label'], new_name))
+
+        catalog.move(moves)
+        self.logger.info('Moved {} of {} images into categories'.format(len(moves), len(rows)))
+
+    @staticmethod
+    def __write_categorize_report(report_path, predictions_report):
+        with open(report_path, 'w', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(['file', 'label', 'confidence'] + constants.CATEGORIES)
+            for img, label, prediction_confidence, prediction in predictions_report:
+                writer.writerow([img, label, '{:.6f}'.format(prediction_confidence)] +
+                                ['{:.6f}'.format(probability) for probability in prediction])
 
     def randomly_delete_images(self, count_files_after_delete):
         self.logger.info('Randomly deleting images from categories')
 
+        catalog = self.__get_synced_catalog()
+        # only images are counted and deleted
+        counts = catalog.count_images()
         for category in constants.CATEGORIES:
             category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
 
-            list_category_dir = os.listdir(category_dir)
-            count_delete = len(list_category_dir) - count_files_after_delete
-
+            count_delete = counts.get(category, 0) - count_files_after_delete
             if count_delete > 0:
 
                 self.logger.info('Deleting {} images in category {}'.format(count_delete, category))
 
-                for i in range(0, count_delete - 1):
-                    while True:
-                        chosen_image = random.choice(list_category_dir)
+                names = catalog.sample(category, count_delete)
+                for img in names:
+                    # remove the chosen image
+                    os.remove(os.path.join(category_dir, img))
+                catalog.remove(category, names)
 
-                        image_path = os.path.join(category_dir, chosen_image)
-                        image_array = cv2.imread(image_path)
+        self.rename_images_in_categories()
 
-                        if image_array is not None:
-                            # remove the loaded image
-                            os.remove(image_path)
-                            break
+    def remove_duplicates_in_categories(self, max_distance=constants.DUPLICATE_MAX_DISTANCE, remove=False,
+                                        report_name=constants.DUPLICATE_REPORT_NAME):
+        # near-duplicates (e.g. rois of consecutive frames) are reported, and deleted if remove is set
+        self.logger.info('Searching duplicates in categories, max distance {}'.format(max_distance))
 
-        self.rename_images_in_categories()
+        # hashes of earlier runs, only new or changed files are hashed again
+        index = DuplicateIndex(constants.DUPLICATE_INDEX_DIR)
+        index.load()
+        catalog = self.__get_synced_catalog()
+
+        # 0: category, 1: file of the duplicate, 2: file of the kept image, 3: hamming distance
+        duplicates_report = []
+        errors = []
+        image_paths_all = []
+        for category in constants.CATEGORIES:
+            category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
+
+            # the first image of the natural order is kept, e.g. the original before its augmented versions
+            rows = natsorted(catalog.get_images(category, ['name', 'size', 'mtime_ns']), key=lambda row: row['name'])
+            image_paths = [os.path.join(category_dir, row['name']) for row in rows]
+
+            image_paths_missing = []
+            file_stats_missing = []
+            for row, image_path in zip(rows, image_paths):
+                file_stat = (row['size'], row['mtime_ns'])
+                if index.lookup(image_path, file_stat) is None:
+                    image_paths_missing.append(image_path)
+                    file_stats_missing.append(file_stat)
+
+            if len(image_paths_missing) > 0:
+                results, errors_category = self.executor.map(extractor_tasks.read_image_hash, image_paths_missing)
+                errors.extend(errors_category)
+                for image_path, file_stat, hash_value in zip(image_paths_missing, file_stats_missing, results):
+                    if hash_value is not None:
+                        index.add(image_path, file_stat, hash_value)
+
+            duplicates = index.find_duplicates(image_paths, max_distance)
+            self.logger.info('Category {}: {} duplicates in {} images'.format(category, len(duplicates),
+                                                                              len(image_paths)))
+
+            duplicate_paths = set()
+            for duplicate_path, kept_path, distance in duplicates:
+                duplicates_report.append([category, os.path.basename(duplicate_path), os.path.basename(kept_path),
+                                          distance])
+                if remove:
+                    os.remove(duplicate_path)
+                    duplicate_paths.add(duplicate_path)
+            catalog.remove(category, [os.path.basename(duplicate_path) for duplicate_path in duplicate_paths])
+
+            image_paths_all.extend(image_path for image_path in image_paths if image_path not in duplicate_paths)
+
+        self.__report_errors('remove_duplicates_in_categories', errors)
+
+        self.logger.info('Hashes from index: {}, hashed again: {}'.format(index.count_hits, index.count_misses))
+        # removes deleted images from the index
+        index.save(image_paths_all)
+
+        report_path = os.path.join(self.current_working_dir, report_name)
+        with open(report_path, 'w', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(['category', 'file', 'duplicate_of', 'distance'])
+            writer.writerows(duplicates_report)
+        self.logger.info('{} {} duplicates, see: {}'.format('Removed' if remove else 'Found', len(duplicates_report),
+                                                            report_path))
 
     def augment_all_categories(self, aug_count=10):
         self.logger.info('Generating data')
 
+        # synced once for all categories
+        catalog = self.__get_synced_catalog()
         for category in constants.CATEGORIES:
-            self.augment_category(category, aug_count)
+            self.__augment_category(catalog, category, aug_count)
 
     def augment_category(self, category, aug_count=10):
+        self.__augment_category(self.__get_synced_catalog(), category, aug_count)
+
+    def __augment_category(self, catalog, category, aug_count):
         self.logger.info('Augmenting images in category {}'.format(category))
 
         # create the input path for category
         category_dir = os.path.join(self.current_working_dir, constants.OUTPUT_DATA_DIR, category)
-        # searches files in category dir
-        list_category_dir = os.listdir(category_dir)
-        list_category_dir = natsorted(list_category_dir)
-        # loops through all files in path
-        for img in tqdm(list_category_dir):
-            if '.jpg' in img or '.png' in img:
-                image_path = os.path.join(category_dir, img)
-                # load image to array
-                image = load_img(image_path)
-                if image is not None:
-                    # convert image to array
-                    image = img_to_array(image)
-                    # reshape to array rank 4
-                    image = image.reshape((1,) + image.shape)
-                    # create infinite flow of images
-                    images_flow = self.image_data_gen.flow(image, batch_size=1)
-                    for i, new_images in enumerate(images_flow):
-                        # we access only first image because of batch_size=1
-                        new_image = array_to_img(new_images[0], scale=True)
-                        # save the augmented image
-                        image_name = '{:s}_{:s}_aug.jpg'.format(img, str(i))
-                        image_path = os.path.join(category_dir, image_name)
-                        new_image.save(image_path)
-                        # break infinite loop after generated 10 images
-                        if i >= aug_count:
-                            break
+        # the images of the category
+        rows = natsorted(catalog.get_images(category), key=lambda row: row['name'])
+        # every image gets its own seed, so that the result does not depend on the order of the workers
+        seeds = self.augmenter.random_state.randint(0, 2 ** 31 - 1, len(rows))
+        # augments all images in path
+        tasks = [(self.augmenter, category_dir, row['name'], aug_count, seed) for row, seed in zip(rows, seeds)]
+        results, errors = self.executor.map(extractor_tasks.augment_image, tasks)
+        self.__report_errors('augment_category', [(os.path.join(task[1], task[2]), message)
+                                                  for task, message in errors])
+
+        catalog.add([self.__create_derived_row(row, new_row, 'augmented')
+                     for row, new_rows in zip(rows, results) if new_rows is not None for new_row in new_rows])
+
+    @staticmethod
+    def __create_derived_row(row, new_row, origin):
+        # an augmented or inverted image keeps the source of the image it was created from
+        new_row.update({'category': row['category'], 'origin': origin, 'parent_hash': row['content_hash']})
+        new_row.update((column, row[column]) for column in SOURCE_COLUMN_NAMES)
+
+        return new_row
+
+    def __report_errors(self, operation, errors):
+        self.errors[operation] = errors
+        if len(errors) > 0:
+            self.logger.warning('{} files failed in {}, see Extractor.errors'.format(len(errors), operation))
+            for file_path, message in errors:
+                self.logger.debug('Error in {}: {} ({})'.format(operation, message, file_path))
 
     def __create_logger(self):
         self.logger = logging.getLogger('Extractor')
@@ -0,0 +1,205 @@
+import os
+import hashlib
+import struct
+import threading
+import cv2
+import numpy as np
+import constants
+from DataExtractor.duplicate_index import compute_difference_hash
+from Isolator.isolator import Isolator
+
+# magic bytes of the image formats written by the extractor
+JPEG_SIGNATURE = b'\xff\xd8'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# start of frame markers of the jpeg formats (baseline, progressive, lossless, arithmetic), they contain the size
+JPEG_SOF_MARKERS = {0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+# jpeg markers without a length, 0xd0 - 0xd7: restart markers, 0x01: temporary
+JPEG_STANDALONE_MARKERS = {0x01, 0xd0, 0xd1, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7}
+
+# the isolator keeps work buffers, every worker thread (or process) gets its own
+worker_state = threading.local()
+
+
+def get_isolator():
+    if not hasattr(worker_state, 'isolator'):
+        # the images to extract are no consecutive frames, so the boxes of one are not searched in the next
+        worker_state.isolator = Isolator(use_tracking=False)
+
+    return worker_state.isolator
+
+
+def extract_regions_of_interest(task):
+    # 0: path of the image, 1: output directory, 2: name of the image without extension
+    file_string, output_dir, image_name = task
+
+    image = cv2.imread(file_string)
+    if image is None:
+        return []
+
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    regions_of_interest = get_isolator().get_regions_of_interest(image, return_boxes=True)
+
+    # rows of the catalog, the source of the rois is kept
+    rows = []
+    for index, roi_arr in enumerate(regions_of_interest):
+        roi = roi_arr[0]
+        roi_type = roi_arr[1]
+        roi_x, roi_y, roi_width, roi_height = roi_arr[2]
+        roi_file_name = output_dir + '/{:s}_{:s}_{:s}.jpg'.format(image_name, str(index), str(roi_type))
+
+        row = write_image(roi_file_name, roi)
+        row.update({'origin': 'extracted', 'source_frame': image_name, 'roi_index': index,
+                    'signal_type': constants.SIGNAL_TYPES[roi_type], 'roi_x': roi_x, 'roi_y': roi_y,
+                    'roi_width': roi_width, 'roi_height': roi_height})
+        rows.append(row)
+
+    return rows
+
+
+def invert_image(task):
+    # 0: path of the image, 1: path of the inverted image
+    image_path, inverted_image_path = task
+
+    image_array = cv2.imread(image_path)
+    if image_array is None:
+        return None
+
+    image_inv = cv2.bitwise_not(image_array)
+
+    return write_image(inverted_image_path, image_inv)
+
+
+def write_image(image_path, image):
+    # row of the catalog with the attributes of the written file, the content hash is the sha1 of the file
+    result, data = cv2.imencode(os.path.splitext(image_path)[1], image)
+    if not result:
+        raise IOError('could not encode {}'.format(image_path))
+
+    with open(image_path, 'wb') as image_file:
+        image_file.write(data.tobytes())
+    stat = os.stat(image_path)
+
+    return {'name': os.path.basename(image_path),
+            'is_image': 1,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'width': image.shape[1],
+            'height': image.shape[0],
+            'content_hash': hashlib.sha1(data).hexdigest()}
+
+
+def read_image_info(image_path):
+    # row of the catalog for a file that is not in the catalog yet, is_image is 0 if it can not be decoded
+    with open(image_path, 'rb') as image_file:
+        data = image_file.read()
+    stat = os.stat(image_path)
+
+    row = {'name': os.path.basename(image_path),
+           'is_image': 0,
+           'size': stat.st_size,
+           'mtime_ns': stat.st_mtime_ns,
+           'content_hash': hashlib.sha1(data).hexdigest()}
+
+    # the size is read from the header, the image is not decoded
+    image_size = read_image_size(data)
+    if image_size is not None:
+        row.update({'is_image': 1, 'width': image_size[0], 'height': image_size[1]})
+
+    return row
+
+
+def read_image_size(data):
+    # width and height from the header of a png (IHDR chunk) or jpeg (start of frame segment),
+    # None if the data is no png or jpeg or the header is truncated
+    if data.startswith(PNG_SIGNATURE):
+        # the IHDR chunk follows the signature, 0: length, 1: type, 2: width, 3: height
+        if len(data) < 24 or data[12:16] != b'IHDR':
+            return None
+        return struct.unpack('>II', data[16:24])
+
+    if not data.startswith(JPEG_SIGNATURE):
+        return None
+
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xff:
+            return None
+        marker = data[position + 1]
+        # fill bytes before a marker
+        if marker == 0xff:
+            position += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            position += 2
+            continue
+        # the start of scan (0xda) is not reached before the start of frame in a valid jpeg
+        if marker == 0xda or marker == 0xd9:
+            return None
+
+        segment_length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            # 0: precision, 1: height, 2: width
+            if position + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return (width, height) if width > 0 and height > 0 else None
+        position += 2 + segment_length
+
+    return None
+
+
+def read_training_image(image_path):
+    img_array = cv2.imread(image_path)
+    if img_array is None:
+        return None
+
+    return preprocess_training_image(img_array)
+
+
+def read_training_image_with_hash(image_path):
+    # 0: content hash of the file, 1: preprocessed image (None if it could not be decoded)
+    with open(image_path, 'rb') as image_file:
+        data = image_file.read()
+    content_hash = hashlib.sha1(data).hexdigest()
+
+    img_array = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img_array is None:
+        return content_hash, None
+
+    return content_hash, preprocess_training_image(img_array)
+
+
+def read_image_hash(image_path):
+    # perceptual hash of the image for the duplicate index, None if it could not be decoded
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+
+    return compute_difference_hash(image)
+
+
+def preprocess_training_image(img_array):
+    # convert image to grayscale if parameter is set in constants file
+    if constants.USE_GRAY_SCALE:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
+    # resize to normalize data size
+    return cv2.resize(img_array, (constants.IMG_SIZE, constants.IMG_SIZE))
+
+
+def augment_image(task):
+    # 0: batch augmenter, 1: directory of the category, 2: file name of the image, 3: count of augmented images,
+    # 4: seed of the random transformations
+    augmenter, category_dir, img, aug_count, seed = task
+
+    image = cv2.imread(os.path.join(category_dir, img))
+    if image is None:
+        return []
+
+    # all augmented versions of the image are created in one batch
+    augmented_images = augmenter.augment_image(image, aug_count + 1, np.random.RandomState(seed))
+    rows = []
+    for i, new_image in enumerate(augmented_images):
+        image_name = '{:s}_{:s}_aug.jpg'.format(img, str(i))
+        rows.append(write_image(os.path.join(category_dir, image_name), new_image))
+
+    return rows
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+
+class ParallelExecutor:
+
+    def __init__(self, count_workers=None, use_processes=False, start_method=None):
+        # None uses one worker per cpu core, processes need functions that can be pickled
+        self.count_workers = count_workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        # e.g. 'spawn' for workers that use tensorflow, a forked tensorflow session can hang
+        self.start_method = start_method
+
+    def map(self, function, items):
+        # 0: results in the order of the items (None if it failed), 1: errors (item, message) in the order of the items
+        results = [None] * len(items)
+        errors = {}
+
+        if self.count_workers == 1:
+            for index, item in enumerate(tqdm(items)):
+                try:
+                    results[index] = function(item)
+                except Exception as e:
+                    errors[index] = '{}: {}'.format(type(e).__name__, e)
+        else:
+            if self.use_processes:
+                executor = ProcessPoolExecutor(max_workers=self.count_workers,
+                                               mp_context=multiprocessing.get_context(self.start_method))
+            else:
+                executor = ThreadPoolExecutor(max_workers=self.count_workers)
+            with executor:
+                futures = dict((executor.submit(function, item), index) for index, item in enumerate(items))
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        errors[index] = '{}: {}'.format(type(e).__name__, e)
+
+        return results, [(items[index], errors[index]) for index in sorted(errors)]
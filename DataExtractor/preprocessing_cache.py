@@ -0,0 +1,84 @@
+import os
+import json
+import numpy as np
+
+INDEX_FILE_NAME = 'index.json'
+ARRAYS_FILE_NAME = 'arrays.npy'
+
+
+class PreprocessingCache:
+
+    def __init__(self, cache_dir, settings):
+        self.cache_dir = cache_dir
+        # the preprocessing parameters, the cache is discarded if they change
+        self.settings = settings
+
+        # path of the image -> 0: size, 1: modification time in ns, 2: content hash
+        self.entries = {}
+        # content hash -> preprocessed image, a relabelled (moved) image is found by its content
+        self.arrays = {}
+
+        self.count_hits = 0
+        self.count_misses = 0
+
+    def load(self):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE_NAME)
+        if not os.path.exists(index_path):
+            return self
+
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+
+        if index['settings'] != self.settings:
+            return self
+
+        # plain views of the memory map, slicing a np.memmap per image is slow
+        arrays = np.asarray(np.load(os.path.join(self.cache_dir, ARRAYS_FILE_NAME), mmap_mode='r'))
+        self.arrays = dict(zip(index['hashes'], arrays))
+        self.entries = index['entries']
+
+        return self
+
+    def lookup_content(self, content_hash):
+        # the content hash is already known (e.g. from the catalog), the file is not read
+        image_array = self.arrays.get(content_hash)
+        if image_array is None:
+            self.count_misses += 1
+        else:
+            self.count_hits += 1
+
+        return image_array
+
+    def add(self, image_path, file_stat, content_hash, image_array):
+        self.entries[image_path] = [file_stat[0], file_stat[1], content_hash]
+        self.arrays[content_hash] = image_array
+
+    def save(self, image_paths):
+        # only keeps the images that still exist, given by image_paths
+        image_paths = set(image_paths)
+        self.entries = dict((path, entry) for path, entry in self.entries.items() if path in image_paths)
+
+        hashes = sorted(set(entry[2] for entry in self.entries.values() if entry[2] in self.arrays))
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        index_path = os.path.join(self.cache_dir, INDEX_FILE_NAME)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        # the arrays may be a memory map of the old file, so a new file is written and replaces it
+        arrays_path = os.path.join(self.cache_dir, ARRAYS_FILE_NAME)
+        arrays_path_tmp = os.path.join(self.cache_dir, 'arrays_tmp.npy')
+        if len(hashes) > 0:
+            arrays = np.stack([self.arrays[content_hash] for content_hash in hashes])
+        else:
+            arrays = np.empty((0,), np.uint8)
+        np.save(arrays_path_tmp, arrays)
+        os.replace(arrays_path_tmp, arrays_path)
+
+        # the index is written last and marks the cache as complete
+        index = {'settings': self.settings, 'hashes': hashes, 'entries': self.entries}
+        # json.dumps uses the c encoder, json.dump writes in many small chunks
+        with open(index_path, 'w') as index_file:
+            index_file.write(json.dumps(index))
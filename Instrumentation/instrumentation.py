@@ -0,0 +1,76 @@
+import threading
+import time
+
+# stages and counters of the isolator and the tester, e.g. the columns of the CsvSink
+STAGES = ['color_conversion', 'crop', 'downscale', 'preprocess', 'threshold', 'threshold_gradient', 'find_contours',
+          'check_contours', 'crop_rois', 'resize', 'predict', 'draw', 'write']
+COUNTERS = ['contours_raw', 'contours_hierarchy', 'contours_area', 'contours_size', 'contours_ratio',
+            'contours_border', 'contours_pixel_ratio', 'contours_kept', 'rois', 'rois_classified']
+
+
+class Instrumentation:
+
+    def __init__(self, sinks=None):
+        # every finished frame is passed to the sinks (see instrumentation_sinks.py)
+        self.sinks = sinks or []
+
+        # the frame of every thread, so that the stages of the stream runner do not mix
+        self.state = threading.local()
+        self.lock = threading.Lock()
+        self.count_frames = 0
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def start_frame(self):
+        # frames can be nested (e.g. the tester around the isolator), only the outermost one is recorded
+        state = self.state
+        depth = getattr(state, 'depth', 0)
+        state.depth = depth + 1
+        if depth == 0:
+            state.timings = {}
+            state.counters = {}
+            state.last = time.perf_counter()
+
+    def mark(self, stage):
+        # the time since the last mark is added to the stage, a stage can be marked several times per frame
+        state = self.state
+        if getattr(state, 'depth', 0) == 0:
+            return
+
+        now = time.perf_counter()
+        state.timings[stage] = state.timings.get(stage, 0.0) + (now - state.last)
+        state.last = now
+
+    def skip(self):
+        # the time since the last mark is not added to any stage
+        state = self.state
+        if getattr(state, 'depth', 0) > 0:
+            state.last = time.perf_counter()
+
+    def count(self, counter, value=1):
+        state = self.state
+        if getattr(state, 'depth', 0) == 0:
+            return
+
+        state.counters[counter] = state.counters.get(counter, 0) + value
+
+    def end_frame(self):
+        state = self.state
+        state.depth -= 1
+        if state.depth > 0:
+            return
+
+        # timings in ms
+        timings = dict((stage, elapsed * 1000) for stage, elapsed in state.timings.items())
+        counters = state.counters
+
+        with self.lock:
+            frame_index = self.count_frames
+            self.count_frames += 1
+            for sink in self.sinks:
+                sink.record(frame_index, timings, counters)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,111 @@
+import csv
+import math
+import numpy as np
+from Instrumentation.instrumentation import STAGES, COUNTERS
+
+
+class LoggerSink:
+
+    def __init__(self, logger, every_frames=1):
+        self.logger = logger
+        # only every n-th frame is logged
+        self.every_frames = every_frames
+
+    def record(self, frame_index, timings, counters):
+        if frame_index % self.every_frames != 0:
+            return
+
+        timings_string = ', '.join('{}: {:.2f}ms'.format(stage, elapsed) for stage, elapsed in timings.items())
+        counters_string = ', '.join('{}: {}'.format(counter, value) for counter, value in counters.items())
+        self.logger.info('[Instrumentation] frame {}: {} | {}'.format(frame_index, timings_string, counters_string))
+
+    def close(self):
+        pass
+
+
+class CsvSink:
+
+    def __init__(self, file_path, stages=STAGES, counters=COUNTERS):
+        # one row per frame, timings in ms, stages and counters that are not recorded in a frame stay empty
+        self.file = open(file_path, 'w', newline='')
+        self.columns = ['frame'] + ['{}_ms'.format(stage) for stage in stages] + list(counters)
+        self.stages = stages
+        self.counters = counters
+
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def record(self, frame_index, timings, counters):
+        row = [frame_index]
+        row.extend('{:.4f}'.format(timings[stage]) if stage in timings else '' for stage in self.stages)
+        row.extend(counters.get(counter, '') for counter in self.counters)
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class HistogramSink:
+
+    def __init__(self, min_ms=0.001, max_ms=10000, bins_per_decade=100):
+        # log spaced bins, the percentiles of the timings have a relative error of about 1 / bins_per_decade
+        self.count_decades = math.log10(max_ms / min_ms)
+        self.edges = np.logspace(math.log10(min_ms), math.log10(max_ms),
+                                 int(self.count_decades * bins_per_decade) + 1)
+
+        # stage -> counts of the bins (0: below min_ms, last: above max_ms)
+        self.timings = {}
+        # counter -> {value: count of frames}, the counters are small integers
+        self.counters = {}
+        self.count_frames = 0
+
+    def record(self, frame_index, timings, counters):
+        self.count_frames += 1
+        for stage, elapsed in timings.items():
+            histogram = self.timings.get(stage)
+            if histogram is None:
+                histogram = np.zeros(len(self.edges) + 1, np.int64)
+                self.timings[stage] = histogram
+            histogram[np.searchsorted(self.edges, elapsed)] += 1
+
+        for counter, value in counters.items():
+            values = self.counters.setdefault(counter, {})
+            values[value] = values.get(value, 0) + 1
+
+    def get_percentile(self, stage, percentile):
+        # upper edge of the bin that contains the percentile, in ms
+        histogram = self.timings.get(stage)
+        if histogram is None or histogram.sum() == 0:
+            return None
+
+        cumulative = np.cumsum(histogram)
+        index = int(np.searchsorted(cumulative, percentile / 100 * cumulative[-1]))
+        return float(self.edges[min(index, len(self.edges) - 1)])
+
+    def get_counter_percentile(self, counter, percentile):
+        values = self.counters.get(counter)
+        if not values:
+            return None
+
+        sorted_values = sorted(values.items())
+        count = sum(values.values())
+        cumulative = 0
+        for value, count_value in sorted_values:
+            cumulative += count_value
+            if cumulative >= percentile / 100 * count:
+                return value
+
+        return sorted_values[-1][0]
+
+    def get_summary(self, percentiles=(50, 95, 99)):
+        summary = {'frames': self.count_frames, 'timings': {}, 'counters': {}}
+        for stage in self.timings:
+            summary['timings'][stage] = dict(('p{}'.format(p), self.get_percentile(stage, p)) for p in percentiles)
+        for counter in self.counters:
+            summary['counters'][counter] = dict(('p{}'.format(p), self.get_counter_percentile(counter, p))
+                                                for p in percentiles)
+
+        return summary
+
+    def close(self):
+        pass
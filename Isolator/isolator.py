@@ -1,58 +1,86 @@
+import time
 import cv2
 import constants
 import numpy as np
+from Isolator.isolator_buffer_pool import IsolatorBufferPool
 from Isolator.isolator_constants import IsolatorConstants
 from Isolator.isolator_constants_320_240 import IsolatorConstants320240
 from Isolator.isolator_constants_640_480 import IsolatorConstants640480
+from Isolator.isolator_tracker import IsolatorTracker
 
 
 class Isolator:
     CLASS_CONSTANTS = IsolatorConstants
 
-    def __init__(self):
+    # fixed point (8 fractional bits) square root of the squared gradient, clamped to 255 like __detect_edges,
+    # indexed by the two bytes of the uint16 squared gradient in memory order, so that it matches their histogram,
+    # the values and their sums with the histogram counts are integers that float64 holds exactly
+    SQRT_LOOKUP_TABLE = np.zeros((256, 256), dtype=np.float64)
+    SQRT_LOOKUP_TABLE[tuple(np.arange(65536, dtype=np.uint16).view(np.uint8).reshape(-1, 2).T)] = \
+        np.round(np.minimum(np.sqrt(np.arange(65536)), 255) * 256)
+
+    def __init__(self, use_tracking=None):
         self.CONSTANTS = None
 
-    def get_regions_of_interest(self, image):
-        # 0: roi, 1: type
+        # tracking only makes sense for consecutive frames of a video, None uses constants.USE_TRACKING
+        self.use_tracking = constants.USE_TRACKING if use_tracking is None else use_tracking
+
+        # reusable work buffers of all stages, per input resolution and constants class
+        self.buffer_pool = IsolatorBufferPool()
+        self.buffer_key = None
+
+        # constants of the fast isolation, per constants class and scale
+        self.scaled_constants = {}
+
+        # boxes of the previous frames, to only search around them in the next frame
+        self.tracker = IsolatorTracker(constants.TRACKING_FULL_SEARCH_INTERVAL, constants.TRACKING_WINDOW_MARGIN,
+                                       constants.TRACKING_MAX_WINDOW_FRACTION)
+
+        # timings and counters per frame, None disables the instrumentation
+        self.instrumentation = None
+
+    def set_instrumentation(self, instrumentation):
+        self.instrumentation = instrumentation
+
+    def get_regions_of_interest(self, image, return_views=False, return_boxes=False):
+        # 0: roi, 1: type, 2: box (x, y, w, h) of the roi in the image (only with return_boxes)
+        # with return_views the rois are views into the work buffers, valid until the next call
         regions_of_interest = []
+        self.__start_frame()
 
         if constants.USE_GRAY_SCALE:
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            image = self.__convert_to_gray(image)
+            self.__mark('color_conversion')
 
         if self.CONSTANTS is None:
             self.__set_constants(image)
 
-        cropped_images = self.__crop(image)
-        for index, cropped in enumerate(cropped_images):
-            preprocessed_image = self.__preprocess(cropped)
-            threshold_image = self.__threshold(preprocessed_image)
-            contours = self.__find_contours(threshold_image)
-            contours = self.__check_countours(contours)
-            rois = self.__crop_regions_of_interest(cropped, contours)
-
-            for roi in rois:
+        for index, (contours, rois, cropped) in enumerate(self.__isolate(image, return_views)):
+            for contour, roi in zip(contours, rois):
                 roi_arr = [roi, index]
+                if return_boxes:
+                    roi_arr.append(self.__get_box_in_image(index, contour, roi))
                 regions_of_interest.append(roi_arr)
 
+        self.__end_frame()
         return regions_of_interest
 
-    def get_contours_and_rois(self, image):
-        # 0: roi, 1: type
+    def get_contours_and_rois(self, image, return_views=False):
+        # 0: contours, 1: rois, 2: cropped image
+        # with return_views the rois and cropped images are views into the work buffers, valid until the next call
         contours_signal_type = []
+        self.__start_frame()
 
         if constants.USE_GRAY_SCALE:
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            image = self.__convert_to_gray(image)
+            self.__mark('color_conversion')
 
         if self.CLASS_CONSTANTS is not None:
             self.__set_constants(image)
 
-        cropped_images = self.__crop(image)
-        for index, cropped in enumerate(cropped_images):
-            preprocessed_image = self.__preprocess(cropped)
-            threshold_image = self.__threshold(preprocessed_image)
-            contours = self.__find_contours(threshold_image)
-            contours = self.__check_countours(contours)
-            rois = self.__crop_regions_of_interest(cropped, contours)
+        for contours, rois, cropped in self.__isolate(image, return_views):
+            if not return_views:
+                cropped = cropped.copy()
 
             if len(contours) > 0:
                 contour_arr = [contours, rois, cropped]
@@ -61,8 +89,148 @@ class Isolator:
                 contour_arr = [None, None, cropped]
                 contours_signal_type.append(contour_arr)
 
+        self.__end_frame()
         return contours_signal_type
 
+    def __start_frame(self):
+        if self.instrumentation is not None:
+            self.instrumentation.start_frame()
+
+    def __end_frame(self):
+        if self.instrumentation is not None:
+            self.instrumentation.end_frame()
+
+    def __mark(self, stage):
+        if self.instrumentation is not None:
+            self.instrumentation.mark(stage)
+
+    def __count(self, counter, value):
+        if self.instrumentation is not None:
+            self.instrumentation.count(counter, value)
+
+    def __buffer(self, name, shape, dtype):
+        return self.buffer_pool.get(self.buffer_key, name, shape, dtype)
+
+    def __convert_to_gray(self, image):
+        gray = self.buffer_pool.get(image.shape, 'gray', image.shape[:2], np.uint8)
+        cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=gray)
+
+        return gray
+
+    def __isolate(self, image, return_views=False):
+        # 0: contours, 1: rois, 2: cropped image (for every signal type)
+        start = time.perf_counter()
+        self.tracker.start_frame()
+
+        self.buffer_key = (image.shape, self.CONSTANTS)
+        cropped_images = self.__crop(image)
+        self.__mark('crop')
+
+        if constants.USE_FAST_ISOLATION:
+            contours_cropped = self.__detect_contours_downscaled(image)
+        else:
+            contours_cropped = [self.__detect_contours_in_band(index, cropped)
+                                for index, cropped in enumerate(cropped_images)]
+
+        isolated = []
+        for cropped, contours in zip(cropped_images, contours_cropped):
+            # the rois are always cropped from the full resolution image
+            rois = self.__crop_regions_of_interest(cropped, contours, return_views)
+            isolated.append([contours, rois, cropped])
+            self.__count('rois', len(rois))
+        self.__mark('crop_rois')
+
+        if self.use_tracking:
+            self.tracker.end_frame(time.perf_counter() - start)
+
+        return isolated
+
+    def __detect_contours(self, cropped, mean=None):
+        # 0: contours, 1: mean of the gradient image (the given mean is used instead of computing it)
+        if constants.USE_FAST_PREPROCESSING:
+            threshold_image, mean = self.__threshold_gradient(cropped, mean)
+            self.__mark('threshold_gradient')
+        else:
+            preprocessed_image, mean = self.__preprocess(cropped, mean)
+            self.__mark('preprocess')
+            threshold_image = self.__threshold(preprocessed_image)
+            self.__mark('threshold')
+        contours = self.__find_contours(threshold_image)
+        self.__mark('find_contours')
+        contours = self.__check_countours(contours)
+        self.__mark('check_contours')
+        self.__count('contours_kept', len(contours))
+
+        return contours, mean
+
+    def __detect_contours_in_band(self, index, cropped):
+        if not self.use_tracking:
+            contours, _ = self.__detect_contours(cropped)
+            return contours
+
+        key = (index, self.CONSTANTS)
+        window = self.tracker.get_window(key, cropped.shape)
+        if window is not None:
+            # only search in the window around the boxes of the previous frame,
+            # with the mean of the last full search so that the threshold stays the same
+            x, y, w, h = window
+            contours, _ = self.__detect_contours(cropped[y:y + h, x:x + w], self.tracker.get_mean(key))
+            offset = np.array([x, y], dtype=np.int32)
+            contours = [cnt + offset for cnt in contours]
+
+            boxes = [cv2.boundingRect(cnt) for cnt in contours]
+            if not self.tracker.is_lost(key, boxes):
+                self.tracker.update(key, boxes, full_search=False)
+                return contours
+
+        contours, mean = self.__detect_contours(cropped)
+        self.tracker.update(key, [cv2.boundingRect(cnt) for cnt in contours], mean, full_search=True)
+
+        return contours
+
+    def __detect_contours_downscaled(self, image):
+        # runs the contour detection on a downscaled copy with scaled constants,
+        # the contours are mapped back to the crops of the full resolution image
+        scale = constants.FAST_ISOLATION_SCALE
+        full_constants = self.CONSTANTS
+        full_buffer_key = self.buffer_key
+
+        image_height, image_width = image.shape[:2]
+        downscaled_size = (int(round(image_width * scale)), int(round(image_height * scale)))
+        downscaled = self.__buffer('downscaled', (downscaled_size[1], downscaled_size[0]) + image.shape[2:],
+                                  np.uint8)
+        cv2.resize(image, downscaled_size, dst=downscaled, interpolation=cv2.INTER_AREA)
+        self.__mark('downscale')
+
+        scaled_constants = self.scaled_constants.get((full_constants, scale))
+        if scaled_constants is None:
+            scaled_constants = full_constants.scaled(scale)
+            self.scaled_constants[(full_constants, scale)] = scaled_constants
+
+        self.CONSTANTS = scaled_constants
+        self.buffer_key = (downscaled.shape, scaled_constants)
+        try:
+            contours_cropped = [self.__detect_contours_in_band(index, cropped)
+                                for index, cropped in enumerate(self.__crop(downscaled))]
+        finally:
+            self.CONSTANTS = full_constants
+            self.buffer_key = full_buffer_key
+
+        # offset of the crops, 0: info, 1: stop
+        offsets_full = [(full_constants.CROP_WIDTH_START, full_constants.CROP_INFO_HEIGHT_START),
+                        (full_constants.CROP_WIDTH_START, full_constants.CROP_STOP_HEIGHT_START)]
+        offsets_scaled = [(scaled_constants.CROP_WIDTH_START, scaled_constants.CROP_INFO_HEIGHT_START),
+                          (scaled_constants.CROP_WIDTH_START, scaled_constants.CROP_STOP_HEIGHT_START)]
+
+        contours_full = []
+        for contours, offset_full, offset_scaled in zip(contours_cropped, offsets_full, offsets_scaled):
+            offset_full = np.array(offset_full, dtype=np.float64)
+            offset_scaled = np.array(offset_scaled, dtype=np.float64)
+            contours_full.append([np.round((cnt + offset_scaled) / scale - offset_full).astype(np.int32)
+                                  for cnt in contours])
+
+        return contours_full
+
     def __set_constants(self, image):
         if constants.USE_GRAY_SCALE:
             image_height, image_width = image.shape
@@ -93,133 +261,301 @@ class Isolator:
 
         return [image_info, image_stop]
 
-    def __detect_edges(self, channel):
-        sobel_x = cv2.Sobel(channel, cv2.CV_16S, 1, 0)
-        sobel_y = cv2.Sobel(channel, cv2.CV_16S, 0, 1)
-        sobel = np.hypot(sobel_x, sobel_y)
-        sobel[sobel > 255] = 255
+    def __detect_edges(self, channel, magnitude):
+        # the sobel values are integers, in float32 they are exact and np.hypot needs no casting buffers
+        sobel_x = cv2.Sobel(channel, cv2.CV_32F, 1, 0, dst=self.__buffer('sobel_x_float', magnitude.shape, np.float32))
+        sobel_y = cv2.Sobel(channel, cv2.CV_32F, 0, 1, dst=self.__buffer('sobel_y_float', magnitude.shape, np.float32))
+        np.hypot(sobel_x, sobel_y, out=magnitude)
+        np.minimum(magnitude, 255, out=magnitude)
 
-        return sobel
+        return magnitude
 
-    def __preprocess(self, image):
+    def __preprocess(self, image, mean=None):
+        shape = image.shape[:2]
+        magnitude = self.__buffer('magnitude', shape, np.float32)
         if constants.USE_GRAY_SCALE:
             # create gradient image from gray scale image
             # for better performance (only 1 channel)
-            image = self.__detect_edges(image)
+            self.__detect_edges(image, magnitude)
         else:
             # create gradient image from all 3 color channels
             # calculate gradient for channels and put it back together
-            image = np.max(np.array(
-                [self.__detect_edges(image[:, :, 0]),
-                 self.__detect_edges(image[:, :, 1]),
-                 self.__detect_edges(image[:, :, 2])]), axis=0)
+            self.__detect_edges(image[:, :, 0], magnitude)
+            magnitude_channel = self.__buffer('magnitude_channel', shape, np.float32)
+            for channel in range(1, 3):
+                self.__detect_edges(image[:, :, channel], magnitude_channel)
+                np.maximum(magnitude, magnitude_channel, out=magnitude)
         # calculate mean of the image
-        mean = np.mean(image)
+        if mean is None:
+            mean = np.mean(magnitude)
         # everything that is below the mean of the image will be set to black
-        image[image <= mean + self.CONSTANTS.ADDITION_MEAN] = 0
+        below_mean = self.__buffer('below_mean', shape, np.bool_)
+        np.less_equal(magnitude, mean + self.CONSTANTS.ADDITION_MEAN, out=below_mean)
+        np.copyto(magnitude, 0, where=below_mean)
         # convert the image back to a numpy array
-        image = np.asarray(image, np.uint8)
+        image = self.__buffer('preprocessed', shape, np.uint8)
+        np.copyto(image, magnitude, casting='unsafe')
 
-        return image
+        return image, mean
 
     def __threshold(self, image):
-        image = cv2.inRange(image, self.CONSTANTS.THRESHOLD_LOWER, self.CONSTANTS.THRESHOLD_UPPER)
+        image = cv2.inRange(image, self.CONSTANTS.THRESHOLD_LOWER, self.CONSTANTS.THRESHOLD_UPPER,
+                            dst=self.__buffer('threshold', image.shape, np.uint8))
 
         return image
 
+    def __detect_edges_squared(self, channel, squared):
+        # squared gradient magnitude in 16 bit, saturated at 65535 (everything above 255 ** 2 is clamped anyway)
+        sobel_x = cv2.Sobel(channel, cv2.CV_16S, 1, 0, dst=self.__buffer('sobel_x', squared.shape, np.int16))
+        sobel_y = cv2.Sobel(channel, cv2.CV_16S, 0, 1, dst=self.__buffer('sobel_y', squared.shape, np.int16))
+        squared_y = self.__buffer('squared_y', squared.shape, np.uint16)
+        cv2.multiply(sobel_x, sobel_x, dst=squared, dtype=cv2.CV_16U)
+        cv2.multiply(sobel_y, sobel_y, dst=squared_y, dtype=cv2.CV_16U)
+        cv2.add(squared, squared_y, dst=squared)
+
+        return squared
+
+    def __threshold_gradient(self, image, mean=None):
+        # integer only version of __preprocess and __threshold, writes into preallocated buffers
+        # the mask matches the float version, except for pixels whose gradient magnitude lies
+        # within 1/256 of the mean threshold (the mean is computed in 8 bit fixed point)
+        shape = image.shape[:2]
+        squared = self.__buffer('squared', shape, np.uint16)
+
+        if constants.USE_GRAY_SCALE:
+            self.__detect_edges_squared(image, squared)
+        else:
+            # the maximum of the squared gradients is the square of the maximum gradient
+            self.__detect_edges_squared(image[:, :, 0], squared)
+            squared_channel = self.__buffer('squared_channel', shape, np.uint16)
+            for channel in range(1, 3):
+                self.__detect_edges_squared(image[:, :, channel], squared_channel)
+                cv2.max(squared, squared_channel, dst=squared)
+
+        # mean of the gradient magnitude clamped to 255, from the histogram of the squared gradients, a 2d histogram
+        # of their two bytes, so that no index array or square root per pixel is needed
+        if mean is None:
+            squared_bytes = squared.view(np.uint8).reshape(shape[0], shape[1], 2)
+            histogram = cv2.calcHist([squared_bytes], [0, 1], None, [256, 256], [0, 256, 0, 256],
+                                     hist=self.__buffer('histogram', (256, 256), np.float32))
+            counts = self.__buffer('histogram_counts', (256, 256), np.float64)
+            np.copyto(counts, histogram)
+            mean = np.vdot(counts, self.SQRT_LOOKUP_TABLE) / (squared.size * 256)
+
+        # a pixel is kept if magnitude > mean + ADDITION_MEAN and THRESHOLD_LOWER <= int(magnitude) <= THRESHOLD_UPPER,
+        # compared on the squared magnitude to avoid the square root
+        limit_mean = mean + self.CONSTANTS.ADDITION_MEAN
+        upper = min((self.CONSTANTS.THRESHOLD_UPPER + 1) ** 2 - 1, 65535)
+        if self.CONSTANTS.THRESHOLD_LOWER > 0:
+            lower = max(self.CONSTANTS.THRESHOLD_LOWER ** 2, int(limit_mean * limit_mean) + 1)
+        else:
+            # pixels below the mean are set to 0, which is inside the threshold range
+            lower = 0
+            upper = max(upper, min(int(limit_mean * limit_mean), 65535))
+        threshold = cv2.inRange(squared, lower, upper, dst=self.__buffer('threshold', shape, np.uint8))
+
+        return threshold, mean
+
     def __find_contours(self, image):
         image_height, image_width = image.shape
         _, contours, hierarchy = cv2.findContours(image, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
         contours_hierarchy = []
-        for i, cnt in enumerate(contours):
-            if (hierarchy[0][i][3] != -1 and hierarchy[0][i][2] == -1) or \
-                    (hierarchy[0][i][3] == -1 and hierarchy[0][i][2] > 0) or \
-                    (hierarchy[0][i][3] > 0 and hierarchy[0][i][2] > 0):
-                if self.CONSTANTS.AREA_SIZE_MIN < cv2.contourArea(cnt) < self.CONSTANTS.AREA_SIZE_MAX:
-                    x, y, w, h = cv2.boundingRect(cnt)
-                    if w < self.CONSTANTS.WIDTH_MAX and h < self.CONSTANTS.HEIGHT_MAX:
-                        if self.CONSTANTS.WIDTH_HEIGHT_RATIO_MIN < w / h < self.CONSTANTS.WIDTH_HEIGHT_RATIO_MAX:
-                            length = int(w)
-                            height = int(h)
-
-                            point_1_x = int(x + w // 2 - length // 2)
-                            point_1_y = int(y + h // 2 - height // 2)
-                            point_2_x = point_1_x + length
-                            point_2_y = point_1_y + height
-
-                            if point_1_y > 0 and point_1_x > 0 and point_2_y < image_height and point_2_x < image_width:
-                                region_of_interest = image[point_1_y:point_2_y, point_1_x:point_2_x]
-                                if self.__qualifies_as_number(region_of_interest):
-                                    contours_hierarchy.append(cnt)
+        # contours that passed each filter, for the instrumentation
+        count_hierarchy = count_area = count_size = count_ratio = count_border = 0
+
+        if len(contours) > 0:
+            # 2: first child, 3: parent of every contour
+            child = hierarchy[0][:, 2]
+            parent = hierarchy[0][:, 3]
+            passed = ((parent != -1) & (child == -1)) | ((parent == -1) & (child > 0)) | ((parent > 0) & (child > 0))
+            indices = np.flatnonzero(passed)
+            count_hierarchy = len(indices)
+
+        if count_hierarchy > 0:
+            # the filters are masks over the statistics of all contours that passed the hierarchy
+            areas, x, y, w, h = self.__get_contour_statistics([contours[i] for i in indices])
+            passed = (self.CONSTANTS.AREA_SIZE_MIN < areas) & (areas < self.CONSTANTS.AREA_SIZE_MAX)
+            count_area = int(np.count_nonzero(passed))
+            passed &= (w < self.CONSTANTS.WIDTH_MAX) & (h < self.CONSTANTS.HEIGHT_MAX)
+            count_size = int(np.count_nonzero(passed))
+            ratios = w / h
+            passed &= (self.CONSTANTS.WIDTH_HEIGHT_RATIO_MIN < ratios) & \
+                (ratios < self.CONSTANTS.WIDTH_HEIGHT_RATIO_MAX)
+            count_ratio = int(np.count_nonzero(passed))
+            # the box must not touch the border of the image
+            passed &= (y > 0) & (x > 0) & (y + h < image_height) & (x + w < image_width)
+            count_border = int(np.count_nonzero(passed))
+
+            if count_border > 0:
+                # 0: x, 1: y, 2: x end, 3: y end of the boxes
+                boxes = np.stack([x, y, x + w, y + h], axis=1)[passed]
+                candidates = indices[passed]
+                # the pixel ratio of all candidates is tested at once
+                qualifies = self.__qualify_as_numbers(image, boxes)
+                contours_hierarchy = [contours[i] for i in candidates[qualifies]]
+
+        if self.instrumentation is not None:
+            self.__count('contours_raw', len(contours))
+            self.__count('contours_hierarchy', count_hierarchy)
+            self.__count('contours_area', count_area)
+            self.__count('contours_size', count_size)
+            self.__count('contours_ratio', count_ratio)
+            self.__count('contours_border', count_border)
+            self.__count('contours_pixel_ratio', len(contours_hierarchy))
 
         return contours_hierarchy
 
-    def __qualifies_as_number(self, region_of_interest):
-        roi_h, roi_w = region_of_interest.shape
-        anz_pixel = roi_h * roi_w
-        anz_pixel_white = np.sum(region_of_interest == 255)
+    def __get_contour_statistics(self, contours):
+        # area and bounding box (x, y, w, h) of every contour, computed over the points of all contours at once,
+        # the values are the same as the ones of cv2.contourArea and cv2.boundingRect,
+        # the points and every array of the size of the points are pooled buffers
+        count_contours = len(contours)
+        lengths = np.fromiter(map(len, contours), np.intp, count_contours)
+        starts = np.zeros(count_contours, np.intp)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        ends = starts + lengths - 1
+        count_points = int(ends[-1]) + 1
+        points = np.concatenate(contours, out=self.__buffer('contour_points', (count_points, 1, 2), np.int32))
+        x = points[:, 0, 0]
+        y = points[:, 0, 1]
+
+        # shoelace formula, the last point of every contour is followed by its first one,
+        # int32 is exact: the products are smaller than the image and the sum of a contour is twice its area
+        # (the partial sums may wrap around, the sum of the contour does not)
+        cross = self.__buffer('contour_cross', (count_points,), np.int32)
+        products = self.__buffer('contour_products', (count_points,), np.int32)
+        np.multiply(x[:-1], y[1:], out=cross[:-1])
+        np.multiply(x[1:], y[:-1], out=products[:-1])
+        np.subtract(cross[:-1], products[:-1], out=cross[:-1])
+        cross[ends] = x[ends] * y[starts] - x[starts] * y[ends]
+        areas = np.add.reduceat(cross, starts, dtype=np.int32, out=self.__buffer('contour_areas', (count_contours,),
+                                                                                 np.int32))
+        areas = np.abs(areas, out=areas) * 0.5
+
+        x_min = np.minimum.reduceat(x, starts, out=self.__buffer('contour_x', (count_contours,), np.int32))
+        y_min = np.minimum.reduceat(y, starts, out=self.__buffer('contour_y', (count_contours,), np.int32))
+        w = np.maximum.reduceat(x, starts, out=self.__buffer('contour_w', (count_contours,), np.int32))
+        h = np.maximum.reduceat(y, starts, out=self.__buffer('contour_h', (count_contours,), np.int32))
+        w -= x_min - 1
+        h -= y_min - 1
+
+        return areas, x_min, y_min, w, h
+
+    def __qualify_as_numbers(self, image, boxes):
+        # one integral image of the white pixels answers the count of any box with four lookups
+        image_height, image_width = image.shape
+        white = np.equal(image, 255, out=self.__buffer('white', image.shape, np.bool_)).view(np.uint8)
+        integral = cv2.integral(white, sum=self.__buffer('integral', (image_height + 1, image_width + 1), np.int32),
+                                sdepth=cv2.CV_32S)
+
+        # the corners of all boxes are gathered at once, 0: top left, 1: top right, 2: bottom left, 3: bottom right
+        corners = integral.take(boxes[:, [1, 1, 3, 3]] * (image_width + 1) + boxes[:, [0, 2, 0, 2]])
+        anz_pixel = (boxes[:, 3] - boxes[:, 1]) * (boxes[:, 2] - boxes[:, 0])
+        anz_pixel_white = corners[:, 3] - corners[:, 1] - corners[:, 2] + corners[:, 0]
         anz_pixel_black = anz_pixel - anz_pixel_white
         anz_pixel_black_ratio = (anz_pixel_black / anz_pixel) * 100
 
-        if anz_pixel_black_ratio <= self.CONSTANTS.PIXEL_RATIO_MIN:
-            qualifies_as_number = False
-        elif anz_pixel_black_ratio >= self.CONSTANTS.PIXEL_RATIO_MAX:
-            qualifies_as_number = False
-        else:
-            qualifies_as_number = True
-
-        return qualifies_as_number
+        return (anz_pixel_black_ratio > self.CONSTANTS.PIXEL_RATIO_MIN) & \
+            (anz_pixel_black_ratio < self.CONSTANTS.PIXEL_RATIO_MAX)
 
     def __check_countours(self, contours):
-        contours_removed = []
-        for i_cnt, cnt in enumerate(contours):
-            for i_cnt2, cnt2 in enumerate(contours):
-                if cnt is not cnt2 and cnt not in contours_removed and cnt2 not in contours_removed:
-                    x, y, w, h = cv2.boundingRect(cnt2)
-                    length = int(w)
-                    height = int(h)
-
-                    point_1_x = int(x + w // 2 - length // 2)
-                    point_1_y = int(y + h // 2 - height // 2)
-
-                    center_x = point_1_x + int(length / 2)
-                    center_y = point_1_y + int(height / 2)
-
-                    dist_center = cv2.pointPolygonTest(cnt, (center_x, center_y), False)
-
-                    if dist_center > -1:
-                        if cv2.contourArea(cnt) > cv2.contourArea(cnt2):
-                            del contours[i_cnt2]
-                            contours_removed.append(cnt2)
-                        else:
-                            del contours[i_cnt]
-                            contours_removed.append(cnt)
-
-        return contours
-
-    def __crop_regions_of_interest(self, image, contours):
+        # removes nested contours: if the center of a contour lies inside another contour,
+        # only the bigger one is kept (on equal area the one found first is kept)
+        count_contours = len(contours)
+        if count_contours < 2:
+            return contours
+
+        # compute area, bounding box and center of every contour only once
+        areas = [cv2.contourArea(cnt) for cnt in contours]
+        boxes = [cv2.boundingRect(cnt) for cnt in contours]
+        centers = [(x + int(w / 2), y + int(h / 2)) for x, y, w, h in boxes]
+
+        # grid index of the kept contours, every bounding box is registered in all cells it covers
+        cell_size = max(max(w, h) for _, _, w, h in boxes)
+        grid = {}
+
+        kept = []
+        for i in sorted(range(count_contours), key=lambda index: (-areas[index], index)):
+            cells = self.__grid_cells(boxes[i], cell_size)
+
+            # only contours with an overlapping bounding box can contain the center or be contained
+            candidates = set()
+            for cell in cells:
+                candidates.update(grid.get(cell, ()))
+
+            is_nested = False
+            for k in candidates:
+                if self.__box_contains(boxes[k], centers[i]) and \
+                        cv2.pointPolygonTest(contours[k], centers[i], False) > -1:
+                    is_nested = True
+                elif self.__box_contains(boxes[i], centers[k]) and \
+                        cv2.pointPolygonTest(contours[i], centers[k], False) > -1:
+                    is_nested = True
+
+                if is_nested:
+                    break
+
+            if not is_nested:
+                kept.append(i)
+                for cell in cells:
+                    grid.setdefault(cell, []).append(i)
+
+        # keep the order in which the contours were found
+        kept.sort()
+
+        return [contours[i] for i in kept]
+
+    @staticmethod
+    def __grid_cells(box, cell_size):
+        x, y, w, h = box
+        return [(cell_x, cell_y)
+                for cell_x in range(x // cell_size, (x + w - 1) // cell_size + 1)
+                for cell_y in range(y // cell_size, (y + h - 1) // cell_size + 1)]
+
+    @staticmethod
+    def __box_contains(box, point):
+        x, y, w, h = box
+        return x <= point[0] < x + w and y <= point[1] < y + h
+
+    @staticmethod
+    def __get_roi_corners(contour):
+        # the bounding box of the contour enlarged by 10%, 0: x, 1: y, 2: x end, 3: y end in the cropped image
+        x, y, w, h = cv2.boundingRect(contour)
+
+        length = int(w * 1.1)
+        height = int(h * 1.1)
+
+        point_1_x = int(x + w // 2 - length // 2)
+        point_1_y = int(y + h // 2 - height // 2)
+        point_2_x = point_1_x + length
+        point_2_y = point_1_y + height
+
+        if point_1_x < 0:
+            point_1_x = 0
+        if point_1_y < 0:
+            point_1_y = 0
+        if point_2_x < 0:
+            point_2_x = 0
+        if point_2_y < 0:
+            point_2_y = 0
+
+        return point_1_x, point_1_y, point_2_x, point_2_y
+
+    def __get_box_in_image(self, index, contour, roi):
+        # the cropped images of the signal types start at these offsets, the size is the one of the cropped roi
+        point_1_x, point_1_y, _, _ = self.__get_roi_corners(contour)
+        offset_y = self.CONSTANTS.CROP_INFO_HEIGHT_START if index == 0 else self.CONSTANTS.CROP_STOP_HEIGHT_START
+
+        return (point_1_x + self.CONSTANTS.CROP_WIDTH_START, point_1_y + offset_y, roi.shape[1], roi.shape[0])
+
+    def __crop_regions_of_interest(self, image, contours, return_views=False):
         regions_of_interest = []
         for contour in contours:
-            x, y, w, h = cv2.boundingRect(contour)
-
-            length = int(w * 1.1)
-            height = int(h * 1.1)
-
-            point_1_x = int(x + w // 2 - length // 2)
-            point_1_y = int(y + h // 2 - height // 2)
-            point_2_x = point_1_x + length
-            point_2_y = point_1_y + height
-
-            if point_1_x < 0:
-                point_1_x = 0
-            if point_1_y < 0:
-                point_1_y = 0
-            if point_2_x < 0:
-                point_2_x = 0
-            if point_2_y < 0:
-                point_2_y = 0
+            point_1_x, point_1_y, point_2_x, point_2_y = self.__get_roi_corners(contour)
 
             region_of_interest = image[point_1_y:point_2_y, point_1_x:point_2_x]
+            if not return_views:
+                region_of_interest = region_of_interest.copy()
             regions_of_interest.append(region_of_interest)
 
         return regions_of_interest
@@ -229,3 +565,17 @@ class Isolator:
         reshaped_image = resized_image_array.reshape(-1, constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION)
 
         return reshaped_image
+
+    def reshape_images_for_input(self, image_arrays):
+        # stack all images into one batch of shape (N, IMG_SIZE, IMG_SIZE, DIMENSION)
+        batch = np.empty((len(image_arrays), constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION),
+                         dtype=np.uint8)
+        for index, image_array in enumerate(image_arrays):
+            batch[index] = self.reshape_image_for_input(image_array)[0]
+
+        return batch
+
+    @staticmethod
+    def scale_images_for_input(batch):
+        # the keras and numpy models are trained on the pixels scaled to [0, 1], every predict of them scales here
+        return np.multiply(batch, constants.INPUT_SCALE, dtype=np.float32)
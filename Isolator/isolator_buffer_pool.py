@@ -0,0 +1,29 @@
+import numpy as np
+
+
+class IsolatorBufferPool:
+
+    def __init__(self):
+        # 0: key (resolution, constants class), 1: name of the buffer
+        self.buffers = {}
+        self.count_allocations = 0
+
+    def get(self, key, name, shape, dtype):
+        # returns the buffer with the given name, it is only allocated on the first request,
+        # smaller requests (e.g. tracking windows) get a contiguous view of the existing buffer
+        size = 1
+        for length in shape:
+            size *= length
+        buffer = self.buffers.get((key, name))
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            self.buffers[(key, name)] = buffer
+            self.count_allocations += 1
+
+        return buffer[:size].reshape(shape)
+
+    def clear(self):
+        self.buffers.clear()
+
+    def size_in_bytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
@@ -9,3 +9,19 @@ class IsolatorConstants:
 
     THRESHOLD_LOWER = 20
     THRESHOLD_UPPER = 200
+
+    @classmethod
+    def scaled(cls, scale):
+        # constants for an image resized by scale, lengths scale linear and areas quadratic
+        return type('{}Scaled'.format(cls.__name__), (cls,), {
+            'AREA_SIZE_MIN': cls.AREA_SIZE_MIN * scale ** 2,
+            'AREA_SIZE_MAX': cls.AREA_SIZE_MAX * scale ** 2,
+            'WIDTH_MAX': cls.WIDTH_MAX * scale,
+            'HEIGHT_MAX': cls.HEIGHT_MAX * scale,
+            'CROP_INFO_HEIGHT_START': int(round(cls.CROP_INFO_HEIGHT_START * scale)),
+            'CROP_INFO_HEIGHT_END': int(round(cls.CROP_INFO_HEIGHT_END * scale)),
+            'CROP_STOP_HEIGHT_START': int(round(cls.CROP_STOP_HEIGHT_START * scale)),
+            'CROP_STOP_HEIGHT_END': int(round(cls.CROP_STOP_HEIGHT_END * scale)),
+            'CROP_WIDTH_START': int(round(cls.CROP_WIDTH_START * scale)),
+            'CROP_WIDTH_END': int(round(cls.CROP_WIDTH_END * scale))
+        })
@@ -0,0 +1,91 @@
+class IsolatorTracker:
+
+    def __init__(self, full_search_interval, window_margin, max_window_fraction):
+        # a full search of the band is done at least every full_search_interval frames
+        self.full_search_interval = full_search_interval
+        # the search window contains the boxes enlarged by window_margin times their size on every side
+        self.window_margin = window_margin
+        # a window covering more than max_window_fraction of the band costs about as much as a full search
+        self.max_window_fraction = max_window_fraction
+
+        # 0: key (band index, constants class), 1: track
+        # track, 0: boxes of the accepted contours, 1: mean of the gradient image, 2: frames since full search
+        self.tracks = {}
+
+        self.frame_tracked = True
+        self.count_frames = 0
+        self.count_tracked_frames = 0
+        self.time_full_frames = 0.0
+        self.time_tracked_frames = 0.0
+        self.count_windows = 0
+        self.sum_window_fractions = 0.0
+
+    def get_window(self, key, image_shape):
+        # returns the search window (x, y, w, h) around all boxes or None if the band needs a full search,
+        # one window for all boxes runs the contour detection once, its fixed cost is paid only once per band
+        track = self.tracks.get(key)
+        if track is None or len(track[0]) == 0 or track[2] >= self.full_search_interval:
+            return None
+
+        image_height, image_width = image_shape[:2]
+        x_start, y_start, x_end, y_end = image_width, image_height, 0, 0
+        for x, y, w, h in track[0]:
+            margin = int(max(w, h) * self.window_margin) + 1
+            x_start = min(x_start, max(0, x - margin))
+            y_start = min(y_start, max(0, y - margin))
+            x_end = max(x_end, min(image_width, x + w + margin))
+            y_end = max(y_end, min(image_height, y + h + margin))
+
+        window_fraction = (x_end - x_start) * (y_end - y_start) / float(image_width * image_height)
+        self.count_windows += 1
+        self.sum_window_fractions += window_fraction
+        if window_fraction > self.max_window_fraction:
+            return None
+
+        return x_start, y_start, x_end - x_start, y_end - y_start
+
+    def get_mean(self, key):
+        return self.tracks[key][1]
+
+    def is_lost(self, key, boxes):
+        # the track is lost as soon as one of the tracked boxes is not found again
+        return len(boxes) < len(self.tracks[key][0])
+
+    def update(self, key, boxes, mean=None, full_search=True):
+        if full_search:
+            self.tracks[key] = [boxes, mean, 0]
+            self.frame_tracked = False
+        else:
+            track = self.tracks[key]
+            self.tracks[key] = [boxes, track[1], track[2] + 1]
+
+    def start_frame(self):
+        self.frame_tracked = True
+
+    def end_frame(self, elapsed):
+        self.count_frames += 1
+        if self.frame_tracked:
+            self.count_tracked_frames += 1
+            self.time_tracked_frames += elapsed
+        else:
+            self.time_full_frames += elapsed
+
+    def reset(self):
+        self.tracks.clear()
+
+    def get_statistics(self):
+        count_full_frames = self.count_frames - self.count_tracked_frames
+        mean_time_full = self.time_full_frames / count_full_frames if count_full_frames > 0 else 0.0
+        mean_time_tracked = self.time_tracked_frames / self.count_tracked_frames \
+            if self.count_tracked_frames > 0 else 0.0
+
+        return {
+            'frames': self.count_frames,
+            'tracked_frames': self.count_tracked_frames,
+            'tracked_fraction': self.count_tracked_frames / self.count_frames if self.count_frames > 0 else 0.0,
+            'mean_time_full_ms': mean_time_full * 1000,
+            'mean_time_tracked_ms': mean_time_tracked * 1000,
+            # the full search frames of a tracking run are no baseline (e.g. they are the frames of new scenes),
+            # the time saved is measured against a run without tracking (see benchmark_tracking)
+            'mean_window_fraction': self.sum_window_fractions / self.count_windows if self.count_windows > 0 else 0.0
+        }
@@ -0,0 +1,171 @@
+import json
+import h5py
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+class NumpyModel:
+
+    def __init__(self, model_path):
+        # forward pass of a sequential keras model saved as .h5 (Model.save_model), without tensorflow
+        self.model_path = model_path
+        # 0: class name of the layer, 1: config of the layer, 2: weights of the layer
+        self.layers = []
+
+        self.__load(model_path)
+
+    def predict(self, x, batch_size=None):
+        # same interface as the predict of a keras model, batch_size splits the input
+        if isinstance(x, list):
+            x = x[0]
+        x = np.asarray(x, np.float32)
+
+        if batch_size is None or batch_size >= len(x):
+            return self.__forward(x)
+
+        return np.concatenate([self.__forward(x[start:start + batch_size])
+                               for start in range(0, len(x), batch_size)])
+
+    def __load(self, model_path):
+        with h5py.File(model_path, 'r') as model_file:
+            if 'model_config' not in model_file.attrs:
+                raise ValueError('{} contains no model config, save it with model.save'.format(model_path))
+
+            model_config = model_file.attrs['model_config']
+            if isinstance(model_config, bytes):
+                model_config = model_config.decode('utf-8')
+            model_config = json.loads(model_config)
+
+            if model_config['class_name'] != 'Sequential':
+                raise ValueError('only sequential models are supported, not {}'.format(model_config['class_name']))
+
+            # keras < 2.2.5 stores the layers as list, later versions in the key 'layers'
+            layer_configs = model_config['config']
+            if isinstance(layer_configs, dict):
+                layer_configs = layer_configs['layers']
+
+            weights_group = model_file['model_weights'] if 'model_weights' in model_file else model_file
+            for layer_config in layer_configs:
+                class_name = layer_config['class_name']
+                config = layer_config['config']
+                if class_name == 'InputLayer':
+                    continue
+
+                weights = []
+                if config['name'] in weights_group:
+                    layer_group = weights_group[config['name']]
+                    # the weight names are in the order of the layer weights, e.g. kernel, bias
+                    for weight_name in layer_group.attrs.get('weight_names', []):
+                        if isinstance(weight_name, bytes):
+                            weight_name = weight_name.decode('utf-8')
+                        weights.append(np.asarray(layer_group[weight_name], np.float32))
+
+                self.layers.append(self.__create_layer(class_name, config, weights))
+
+    @staticmethod
+    def __create_layer(class_name, config, weights):
+        if class_name == 'Conv2D':
+            if config.get('data_format', 'channels_last') != 'channels_last' or \
+                    tuple(config.get('dilation_rate', (1, 1))) != (1, 1):
+                raise ValueError('Conv2D {} is not supported'.format(config['name']))
+            kernel = weights[0]
+            bias = weights[1] if config.get('use_bias', True) else None
+            # 0: rows of the im2col matrix (kernel height * kernel width * channels), 1: filters
+            kernel_matrix = np.ascontiguousarray(kernel.reshape(-1, kernel.shape[-1]))
+            return ['Conv2D', {'kernel_size': kernel.shape[:2], 'strides': tuple(config['strides']),
+                               'padding': config['padding'], 'activation': config['activation']},
+                    [kernel_matrix, bias]]
+
+        if class_name == 'MaxPooling2D':
+            pool_size = tuple(config['pool_size'])
+            strides = tuple(config['strides']) if config.get('strides') is not None else pool_size
+            return ['MaxPooling2D', {'pool_size': pool_size, 'strides': strides, 'padding': config['padding']}, []]
+
+        if class_name == 'Dense':
+            bias = weights[1] if config.get('use_bias', True) else None
+            return ['Dense', {'activation': config['activation']}, [weights[0], bias]]
+
+        if class_name == 'Activation':
+            return ['Activation', {'activation': config['activation']}, []]
+
+        if class_name in ['Dropout', 'Flatten']:
+            return [class_name, {}, []]
+
+        raise ValueError('layer {} is not supported'.format(class_name))
+
+    def __forward(self, x):
+        for class_name, config, weights in self.layers:
+            if class_name == 'Conv2D':
+                x = self.__conv_2d(x, weights[0], weights[1], config['kernel_size'], config['strides'],
+                                   config['padding'])
+                x = self.__activation(x, config['activation'])
+            elif class_name == 'MaxPooling2D':
+                x = self.__max_pooling_2d(x, config['pool_size'], config['strides'], config['padding'])
+            elif class_name == 'Dense':
+                x = np.dot(x, weights[0])
+                if weights[1] is not None:
+                    x += weights[1]
+                x = self.__activation(x, config['activation'])
+            elif class_name == 'Activation':
+                x = self.__activation(x, config['activation'])
+            elif class_name == 'Flatten':
+                # channels last, the same order as the flatten of keras
+                x = x.reshape(len(x), -1)
+
+        return x
+
+    @staticmethod
+    def __get_padding(size, kernel_size, stride, padding):
+        # 0: output size, 1: padding before, 2: padding after (same as tensorflow)
+        if padding == 'valid':
+            return (size - kernel_size) // stride + 1, 0, 0
+
+        output_size = (size + stride - 1) // stride
+        padding_total = max((output_size - 1) * stride + kernel_size - size, 0)
+        return output_size, padding_total // 2, padding_total - padding_total // 2
+
+    def __create_windows(self, x, kernel_size, strides, padding, fill_value):
+        # 0: batch, 1: output height, 2: output width, 3: kernel height, 4: kernel width, 5: channels
+        count, height, width, channels = x.shape
+        output_height, top, bottom = self.__get_padding(height, kernel_size[0], strides[0], padding)
+        output_width, left, right = self.__get_padding(width, kernel_size[1], strides[1], padding)
+
+        if top or bottom or left or right:
+            x = np.pad(x, ((0, 0), (top, bottom), (left, right), (0, 0)), mode='constant',
+                       constant_values=fill_value)
+        x = np.ascontiguousarray(x)
+
+        stride_n, stride_h, stride_w, stride_c = x.strides
+        return as_strided(x, shape=(count, output_height, output_width, kernel_size[0], kernel_size[1], channels),
+                          strides=(stride_n, stride_h * strides[0], stride_w * strides[1], stride_h, stride_w,
+                                   stride_c), writeable=False)
+
+    def __conv_2d(self, x, kernel_matrix, bias, kernel_size, strides, padding):
+        # im2col: every output pixel is one row, the convolution is a single matrix multiplication
+        windows = self.__create_windows(x, kernel_size, strides, padding, 0)
+        count, output_height, output_width = windows.shape[:3]
+
+        columns = windows.reshape(count * output_height * output_width, -1)
+        y = np.dot(columns, kernel_matrix)
+        if bias is not None:
+            y += bias
+
+        return y.reshape(count, output_height, output_width, -1)
+
+    def __max_pooling_2d(self, x, pool_size, strides, padding):
+        # the padding is never the maximum
+        windows = self.__create_windows(x, pool_size, strides, padding, -np.inf)
+
+        return windows.max(axis=(3, 4))
+
+    @staticmethod
+    def __activation(x, activation):
+        if activation == 'relu':
+            return np.maximum(x, 0, out=x)
+        if activation == 'softmax':
+            x = np.exp(x - x.max(axis=-1, keepdims=True))
+            return x / x.sum(axis=-1, keepdims=True)
+        if activation == 'linear':
+            return x
+
+        raise ValueError('activation {} is not supported'.format(activation))
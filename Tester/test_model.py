@@ -1,13 +1,27 @@
 import numpy as np
+from Instrumentation.instrumentation import Instrumentation
+from Instrumentation.instrumentation_sinks import CsvSink, HistogramSink
 from Tester.tester import Tester
-from Trainer.Models.model_gnet_light import ModelGNetLight
-from Trainer.Models.model_gnet_deep import ModelGNetDeep
-from Trainer.Models.model_gnet_deep_v2 import ModelGNetDeepV2
-from Trainer.Models.model_gnet_deep_deep import ModelGNetDeepDeep
 
 
 def main():
-    tester = Tester(ModelGNetDeepV2('GNet'), 'CNN-gnet-deep-v2-ultimate-data-15-epochs')
+    model_name = 'CNN-gnet-deep-v2-ultimate-data-15-epochs'
+    # 'keras', 'tflite' (quantized model exported with Model.convert_model_tflite) or 'numpy' (forward pass in numpy)
+    backend = 'keras'
+
+    if backend == 'tflite':
+        tester = Tester(None, model_name, tflite_quantization='int8')
+    elif backend == 'numpy':
+        tester = Tester(None, model_name, use_numpy=True)
+    else:
+        # the models pull in tensorflow, keras-vis and matplotlib, so they are only imported to build a keras model
+        # (ModelGNetLight, ModelGNetDeep and ModelGNetDeepDeep are in Trainer.Models as well)
+        from Trainer.Models.model_gnet_deep_v2 import ModelGNetDeepV2
+        tester = Tester(ModelGNetDeepV2('GNet', inference_only=True), model_name)
+
+    # record the timings of the stages and the counts of the contours of every frame
+    # histogram = HistogramSink()
+    # tester.set_instrumentation(Instrumentation([histogram, CsvSink('instrumentation.csv')]))
 
     # test the model with a given image
     tester.test_model_with_image('frame_overlaying_cnt_2.jpg')
@@ -23,6 +37,9 @@ def main():
     # test the model with a folder of images
     # tester.test_model_with_folder('continuous', display_all=False)
 
+    # test the model with a video file, a camera (e.g. 0) or a folder of images in a pipeline of threads
+    # tester.test_model_with_stream('continuous.mp4', output_folder_name='continuous', display_all=False)
+
     # create video from images command
     # convert *.jpg recognized.mpeg
 
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pytest
+import constants
+from Tester.tester import Tester
+
+tf = pytest.importorskip('tensorflow')
+keras = pytest.importorskip('keras')
+
+
+class KerasModelLoader:
+    # model_obj of the tester for an already trained keras model
+    def __init__(self, model):
+        self.model = model
+
+    def load_model_for_inference(self, model_name):
+        return self.model
+
+
+def create_digit_images(count, seed):
+    # raw gray scale pixels like the rois of the tester, every category has a bright bar at its own height
+    random_state = np.random.RandomState(seed)
+    labels = random_state.randint(len(constants.CATEGORIES), size=count)
+    images = random_state.randint(0, 60, size=(count, constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION))
+    images = images.astype(np.uint8)
+    for image, label in zip(images, labels):
+        image[2 + label * 2:4 + label * 2, 4:24] = 255
+
+    return images, labels
+
+
+def create_keras_model(images, labels):
+    # trained like Model.train_model, on the pixels scaled to [0, 1]
+    model = keras.models.Sequential()
+    model.add(keras.layers.Conv2D(filters=8, kernel_size=3, padding='same', activation='relu',
+                                  input_shape=(constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION)))
+    model.add(keras.layers.MaxPooling2D(pool_size=2))
+    model.add(keras.layers.Flatten())
+    model.add(keras.layers.Dense(len(constants.CATEGORIES), activation='softmax'))
+    model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+    model.fit(np.multiply(images, constants.INPUT_SCALE, dtype=np.float32),
+              keras.utils.to_categorical(labels, len(constants.CATEGORIES)), epochs=5, verbose=0)
+
+    return model
+
+
+def convert_model_int8(model, model_path, calibration_images):
+    # same settings as Model.convert_model_tflite('int8'), tensorflow 2 converts the keras model instead of the file
+    def create_representative_dataset():
+        for image in calibration_images:
+            yield [np.multiply(image[np.newaxis], constants.INPUT_SCALE, dtype=np.float32)]
+
+    if hasattr(tf.lite.TFLiteConverter, 'from_keras_model_file'):
+        converter = tf.lite.TFLiteConverter.from_keras_model_file(model_path)
+    else:
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = create_representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+
+    return converter.convert()
+
+
+def test_tflite_and_keras_agree_on_raw_tester_input(tmp_path, monkeypatch):
+    model_dir = str(tmp_path)
+    monkeypatch.setattr(constants, 'MODEL_DIR', model_dir + os.sep)
+
+    images, labels = create_digit_images(1000, seed=0)
+    keras_model = create_keras_model(images, labels)
+    keras_model.save(os.path.join(model_dir, 'digits.h5'))
+    with open(os.path.join(model_dir, 'digits-int8.tflite'), 'wb') as model_file:
+        model_file.write(convert_model_int8(keras_model, os.path.join(model_dir, 'digits.h5'),
+                                              images[:200]))
+
+    # the rois of the isolator are 2d uint8 gray scale images
+    rois, roi_labels = create_digit_images(200, seed=1)
+    rois = [roi[:, :, 0] for roi in rois]
+    keras_predictions = Tester(KerasModelLoader(keras_model), 'digits').predict_regions_of_interest(rois)
+    tflite_predictions = Tester(None, 'digits', tflite_quantization='int8').predict_regions_of_interest(rois)
+
+    assert np.mean(keras_predictions.argmax(axis=1) == roi_labels) > 0.95
+    assert np.mean(tflite_predictions.argmax(axis=1) == keras_predictions.argmax(axis=1)) >= 0.98
@@ -2,49 +2,69 @@ import logging
 import cv2
 import constants
 import os
+import queue
 import shutil
+import threading
+import time
 import numpy as np
 from tqdm import tqdm
 from Isolator.isolator import Isolator
+from Tester.numpy_model import NumpyModel
+from Tester.tflite_model import TFLiteModel
 
 
 class Tester:
 
-    def __init__(self, model_obj, model_name):
-        model_path = '{}{}.h5'.format(constants.MODEL_DIR, model_name)
-        model_obj.create_model(weights_path=model_path)
-        self.model = model_obj.model
+    def __init__(self, model_obj, model_name, tflite_quantization=None, use_numpy=False):
+        if use_numpy:
+            # forward pass in numpy with the weights of the .h5 file, tensorflow is not needed, model_obj is not needed
+            self.model = NumpyModel('{}{}.h5'.format(constants.MODEL_DIR, model_name))
+        elif tflite_quantization is not None:
+            # model exported by Model.convert_model_tflite, e.g. 'int8' or 'float16', model_obj is not needed
+            self.model = TFLiteModel('{}{}-{}.tflite'.format(constants.MODEL_DIR, model_name, tflite_quantization))
+        else:
+            # create the model with inference_only=True, to skip loading the training data
+            self.model = model_obj.load_model_for_inference(model_name)
         self.isolator = Isolator()
 
+        # timings and counters per frame, None disables the instrumentation
+        self.instrumentation = None
+
         self.logger = None
         self.__create_logger()
 
+    def set_instrumentation(self, instrumentation):
+        # the isolator reports into the same frames
+        self.instrumentation = instrumentation
+        self.isolator.set_instrumentation(instrumentation)
+
     def test_model_with_image(self, image_path):
         image_array = cv2.imread(image_path)
         image_array = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
         regions_of_interest = self.isolator.get_regions_of_interest(image_array)
 
+        # classify all regions of interest with a single forward pass
+        predictions = self.predict_regions_of_interest([roi_arr[0] for roi_arr in regions_of_interest])
+
         for index, roi_arr in enumerate(regions_of_interest):
             roi = roi_arr[0]
             roi_type = roi_arr[1]
 
-            roi_processed = self.isolator.reshape_image_for_input(roi)
-            prediction = self.model.predict([roi_processed])
-
-            i = prediction.argmax(axis=1)[0]
+            prediction = predictions[index]
+            i = prediction.argmax()
             label = constants.CATEGORIES[i]
 
             self.logger.info(
                 '[Prediction] type: {}, category: {} ({:.2f}%)'.format(constants.SIGNAL_TYPES[roi_type],
                                                                        label,
-                                                                       prediction[0][i] * 100))
+                                                                       prediction[i] * 100))
 
             cv2.imshow('ROI', roi)
             cv2.waitKey(0)
 
     def test_model_with_array(self, image_array):
         image_processed = self.isolator.reshape_image_for_input(image_array)
-        prediction = self.model.predict([image_processed])
+        prediction = self.__predict(image_processed)
 
         i = prediction.argmax(axis=1)[0]
         label = constants.CATEGORIES[i]
@@ -54,27 +74,71 @@ class Tester:
         cv2.imshow('ROI', image_array)
         cv2.waitKey(0)
 
+    def predict_regions_of_interest(self, rois):
+        # one predict call for all regions of interest, instead of one per roi
+        if len(rois) == 0:
+            return np.empty((0, len(constants.CATEGORIES)), dtype=np.float32)
+
+        batch = self.isolator.reshape_images_for_input(rois)
+        self.__mark('resize')
+        predictions = self.__predict(batch)
+        self.__mark('predict')
+        self.__count('rois_classified', len(rois))
+
+        return predictions
+
+    def __predict(self, batch):
+        # the tflite model gets the raw pixels, it scales them itself or passes them to its uint8 input,
+        # the other models get the pixels scaled like the training data
+        if not isinstance(self.model, TFLiteModel):
+            batch = self.isolator.scale_images_for_input(batch)
+
+        return self.model.predict(batch, batch_size=len(batch))
+
+    def classify_contours_and_rois(self, contours_signal_type):
+        # gather the rois of all signal types (info and stop) into one batch
+        rois = []
+        for contour_arr in contours_signal_type:
+            if contour_arr[0] is not None:
+                rois.extend(contour_arr[1])
+
+        predictions = self.predict_regions_of_interest(rois)
+
+        # map the predictions back to the signal types, 0: predictions of the contours
+        predictions_signal_type = []
+        start = 0
+        for contour_arr in contours_signal_type:
+            if contour_arr[0] is not None:
+                end = start + len(contour_arr[0])
+                predictions_signal_type.append(predictions[start:end])
+                start = end
+            else:
+                predictions_signal_type.append(None)
+
+        return predictions_signal_type
+
     def __classify_for_signal(self, image, display_all=True):
-        contours = self.isolator.get_contours_and_rois(image)
+        contours_signal_type = self.isolator.get_contours_and_rois(image)
+        predictions_signal_type = self.classify_contours_and_rois(contours_signal_type)
+
+        return self.__draw_signals(contours_signal_type, predictions_signal_type, display_all)
 
+    def __draw_signals(self, contours_signal_type, predictions_signal_type, display_all=True):
         contour_images = []
 
-        for contour_arr in contours:
+        for contour_arr, predictions in zip(contours_signal_type, predictions_signal_type):
             contours = contour_arr[0]
-            rois = contour_arr[1]
             contour_image = contour_arr[2]
             contour_image = cv2.cvtColor(contour_image, cv2.COLOR_GRAY2RGB)
 
             draw_image = np.copy(contour_image)
             if contours is not None:
                 for index, cnt in enumerate(contours):
-                    roi = rois[index]
-                    roi_processed = self.isolator.reshape_image_for_input(roi)
-                    prediction = self.model.predict([roi_processed])
+                    prediction = predictions[index]
 
-                    i = prediction.argmax(axis=1)[0]
+                    i = prediction.argmax()
                     label = constants.CATEGORIES[i]
-                    confidence = int(prediction[0][i] * 100)
+                    confidence = int(prediction[i] * 100)
 
                     color = None
                     if label == '-1' or confidence < 100:
@@ -99,6 +163,7 @@ class Tester:
 
             contour_images.append(draw_image)
 
+        self.__mark('draw')
         return contour_images
 
     def test_model_with_folder(self, folder_name, display_all=True):
@@ -127,6 +192,7 @@ class Tester:
         os.makedirs(os.path.join(current_working_dir, folder_name, 'simulation', 'recognized'))
 
         for i, frame in enumerate(tqdm(frames)):
+            self.__start_frame()
             result = self.__classify_for_signal(frame, display_all=display_all)
 
             # save original image
@@ -138,6 +204,208 @@ class Tester:
             frame_string = 'pic_{:08d}.jpg'.format(i)
             save_string = os.path.join(current_working_dir, folder_name, 'simulation', 'recognized', frame_string)
             cv2.imwrite(save_string, np.concatenate((result[0], result[1]), axis=0))
+            self.__mark('write')
+            self.__end_frame()
+
+    def test_model_with_stream(self, source, output_folder_name='stream', display_all=True, queue_size=8,
+                               count_writers=2, max_frames=None, queue_sample_interval=0.005):
+        # source: camera index, video file or folder with images
+        # the stages run in their own threads and are connected by bounded queues, so a slow stage
+        # blocks the stages before it instead of filling up the memory:
+        # read -> isolate -> classify (this thread, because of keras) -> draw -> write
+        # the queue depths are sampled every queue_sample_interval seconds by their own thread
+        os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
+
+        # create the directories
+        output_path = os.path.join(os.getcwd(), output_folder_name, 'simulation')
+        if os.path.exists(output_path):
+            shutil.rmtree(output_path, ignore_errors=True)
+        os.makedirs(os.path.join(output_path, 'original'))
+        os.makedirs(os.path.join(output_path, 'recognized'))
+
+        stage_names = ['read', 'isolate', 'classify', 'draw', 'write']
+        queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stage_names) - 1)]
+        busy_times = dict((name, 0.0) for name in stage_names)
+        # the writer threads share their stage
+        busy_times_lock = threading.Lock()
+        queue_depths = [[] for _ in queues]
+        stream_ended = threading.Event()
+
+        def isolate(item):
+            index, frame = item
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            return index, frame, self.isolator.get_contours_and_rois(frame_rgb)
+
+        # with instrumentation every stage records its own frames, the stages of a frame run in different threads
+        def draw(item):
+            index, frame, contours_signal_type, predictions_signal_type = item
+            self.__start_frame()
+            try:
+                result = self.__draw_signals(contours_signal_type, predictions_signal_type, display_all)
+            finally:
+                self.__end_frame()
+            return index, frame, np.concatenate(result, axis=0)
+
+        def write(item):
+            index, frame, recognized = item
+            self.__start_frame()
+            try:
+                frame_string = 'pic_{:08d}.jpg'.format(index)
+                cv2.imwrite(os.path.join(output_path, 'original', frame_string), frame)
+                cv2.imwrite(os.path.join(output_path, 'recognized', frame_string), recognized)
+                self.__mark('write')
+            finally:
+                self.__end_frame()
+
+        threads = [threading.Thread(target=self.__read_stream, args=(source, queues[0], busy_times, max_frames)),
+                   threading.Thread(target=self.__run_stage, args=(isolate, queues[0], queues[1], busy_times,
+                                                                   busy_times_lock, 'isolate')),
+                   threading.Thread(target=self.__run_stage, args=(draw, queues[2], queues[3], busy_times,
+                                                                   busy_times_lock, 'draw', count_writers))]
+        for _ in range(count_writers):
+            threads.append(threading.Thread(target=self.__run_stage, args=(write, queues[3], None, busy_times,
+                                                                           busy_times_lock, 'write')))
+        sampler = threading.Thread(target=self.__sample_queue_depths, args=(queues, queue_depths, stream_ended,
+                                                                           queue_sample_interval))
+
+        start = time.perf_counter()
+        for thread in threads + [sampler]:
+            thread.daemon = True
+            thread.start()
+
+        # classify in this thread, the keras model is not used from other threads
+        count_frames = 0
+        while True:
+            item = queues[1].get()
+            if item is None:
+                break
+
+            start_stage = time.perf_counter()
+            self.__start_frame()
+            try:
+                index, frame, contours_signal_type = item
+                predictions_signal_type = self.classify_contours_and_rois(contours_signal_type)
+                item = (index, frame, contours_signal_type, predictions_signal_type)
+            except Exception as e:
+                self.logger.error('Error in stage classify: {}'.format(e))
+                item = None
+            self.__end_frame()
+            busy_times['classify'] += time.perf_counter() - start_stage
+
+            if item is not None:
+                queues[2].put(item)
+                count_frames += 1
+        queues[2].put(None)
+
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stream_ended.set()
+        sampler.join()
+
+        statistics = {
+            'frames': count_frames,
+            'fps': count_frames / elapsed if elapsed > 0 else 0.0,
+            'busy_seconds': busy_times,
+            'queue_depths': dict(('{}->{}'.format(stage_names[i], stage_names[i + 1]),
+                                  {'mean': float(np.mean(depths)) if depths else 0.0,
+                                   'max': int(np.max(depths)) if depths else 0})
+                                 for i, depths in enumerate(queue_depths))
+        }
+
+        self.logger.info('[Stream] frames: {}, fps: {:.1f}'.format(statistics['frames'], statistics['fps']))
+        for name in stage_names:
+            self.logger.info('[Stream] stage {}: busy {:.2f}s ({:.0%})'.format(name, busy_times[name],
+                                                                               busy_times[name] / elapsed
+                                                                               if elapsed > 0 else 0.0))
+        for name, depths in statistics['queue_depths'].items():
+            self.logger.info('[Stream] queue {}: mean depth {:.1f}, max depth {} of {}'.format(name, depths['mean'],
+                                                                                             depths['max'],
+                                                                                             queue_size))
+
+        return statistics
+
+    def __read_stream(self, source, queue_out, busy_times, max_frames=None):
+        index = 0
+        try:
+            if not isinstance(source, int) and os.path.isdir(os.path.join(os.getcwd(), source)):
+                folder_path = os.path.join(os.getcwd(), source)
+                listdir = sorted(os.listdir(folder_path))
+                for f in listdir:
+                    if max_frames is not None and index >= max_frames:
+                        break
+                    start = time.perf_counter()
+                    frame = cv2.imread(os.path.join(folder_path, f))
+                    busy_times['read'] += time.perf_counter() - start
+                    if frame is not None:
+                        queue_out.put((index, frame))
+                        index += 1
+            else:
+                capture = cv2.VideoCapture(source)
+                while max_frames is None or index < max_frames:
+                    start = time.perf_counter()
+                    grabbed, frame = capture.read()
+                    busy_times['read'] += time.perf_counter() - start
+                    if not grabbed:
+                        break
+                    queue_out.put((index, frame))
+                    index += 1
+                capture.release()
+        except Exception as e:
+            self.logger.error('Error in stage read: {}'.format(e))
+        finally:
+            queue_out.put(None)
+
+    def __run_stage(self, function, queue_in, queue_out, busy_times, busy_times_lock, name, count_consumers=1):
+        # runs until the end of the stream, failed items are logged and skipped,
+        # so that the stages before never block on a full queue
+        # the busy time of this thread is added once at the end, other threads can run the same stage
+        busy_time = 0.0
+        while True:
+            item = queue_in.get()
+            if item is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                result = function(item)
+            except Exception as e:
+                self.logger.error('Error in stage {}: {}'.format(name, e))
+                result = None
+            busy_time += time.perf_counter() - start
+
+            if queue_out is not None and result is not None:
+                queue_out.put(result)
+
+        with busy_times_lock:
+            busy_times[name] += busy_time
+
+        if queue_out is not None:
+            for _ in range(count_consumers):
+                queue_out.put(None)
+
+    @staticmethod
+    def __sample_queue_depths(queues, queue_depths, stream_ended, interval):
+        # at a fixed interval, independent of the stages, so that no stage decides when the queues are seen
+        while not stream_ended.wait(interval):
+            for depths, stage_queue in zip(queue_depths, queues):
+                depths.append(stage_queue.qsize())
+
+    def __start_frame(self):
+        if self.instrumentation is not None:
+            self.instrumentation.start_frame()
+
+    def __end_frame(self):
+        if self.instrumentation is not None:
+            self.instrumentation.end_frame()
+
+    def __mark(self, stage):
+        if self.instrumentation is not None:
+            self.instrumentation.mark(stage)
+
+    def __count(self, counter, value):
+        if self.instrumentation is not None:
+            self.instrumentation.count(counter, value)
 
     def __create_logger(self):
         self.logger = logging.getLogger('Tester')
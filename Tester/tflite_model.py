@@ -0,0 +1,84 @@
+import constants
+import numpy as np
+
+# the small tflite runtime is preferred (e.g. on arm), tensorflow is the fallback and only imported if needed
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    Interpreter = None
+
+
+class TFLiteModel:
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+
+        interpreter_class = Interpreter or self.__import_tensorflow_interpreter()
+        # older interpreters do not support the count of threads
+        if num_threads is not None:
+            self.interpreter = interpreter_class(model_path=model_path, num_threads=num_threads)
+        else:
+            self.interpreter = interpreter_class(model_path=model_path)
+        self.interpreter.allocate_tensors()
+
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input_details['shape'][0])
+
+    def predict(self, x, batch_size=None):
+        # same interface as the predict of a keras model, batch_size is given by the input,
+        # x are raw pixels (uint8, like the batches of the tester) or pixels already scaled by constants.INPUT_SCALE
+        if isinstance(x, list):
+            x = x[0]
+        x = np.asarray(x)
+
+        if len(x) == 0:
+            return np.zeros((0,) + tuple(self.output_details['shape'][1:]), np.float32)
+
+        # the tensors are only allocated again if the size of the batch changes
+        if len(x) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_details['index'], [len(x)] + list(x.shape[1:]))
+            self.interpreter.allocate_tensors()
+            self.input_details = self.interpreter.get_input_details()[0]
+            self.output_details = self.interpreter.get_output_details()[0]
+            self.batch_size = len(x)
+
+        self.interpreter.set_tensor(self.input_details['index'], self.__quantize(x))
+        self.interpreter.invoke()
+
+        return self.__dequantize(self.interpreter.get_tensor(self.output_details['index']))
+
+    @staticmethod
+    def __import_tensorflow_interpreter():
+        # tensorflow 2 only has the interpreter as attribute of tf.lite, tensorflow < 1.14 in tf.contrib.lite
+        import tensorflow as tf
+        try:
+            return tf.lite.Interpreter
+        except AttributeError:
+            return tf.contrib.lite.Interpreter
+
+    def __quantize(self, x):
+        dtype = self.input_details['dtype']
+        scale, zero_point = self.input_details['quantization']
+        if x.dtype == np.uint8:
+            # the uint8 input of a model calibrated on the scaled training data is the raw pixel itself
+            if dtype == np.uint8 and zero_point == 0 and np.isclose(scale, constants.INPUT_SCALE):
+                return x
+            # otherwise the raw pixels are scaled like the training data
+            x = np.multiply(x, constants.INPUT_SCALE, dtype=np.float32)
+
+        if dtype == np.float32:
+            return x.astype(np.float32, copy=False)
+
+        # integer input of a fully quantized model: q = x / scale + zero_point
+        info = np.iinfo(dtype)
+        quantized = np.round(x.astype(np.float32) / scale + zero_point)
+
+        return np.clip(quantized, info.min, info.max).astype(dtype)
+
+    def __dequantize(self, y):
+        if self.output_details['dtype'] == np.float32:
+            return y
+
+        scale, zero_point = self.output_details['quantization']
+        return (y.astype(np.float32) - zero_point) * scale
@@ -1,27 +1,29 @@
 import logging
-import pickle
 import numpy as np
 import constants
 import random
 import tensorflow as tf
 import os
+import time
 import keras
 import matplotlib.cm as cm
 import cv2
 from sklearn.preprocessing import LabelBinarizer
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 from keras.optimizers import Adam
 from keras import activations
 from keras.callbacks import TensorBoard
 from keras.utils.vis_utils import plot_model
 from tensorflow.python.framework.graph_util import convert_variables_to_constants
-from tensorflow.python.keras.preprocessing.image import ImageDataGenerator
 from vis.visualization import visualize_activation
 from vis.visualization import visualize_saliency
 from vis.visualization import visualize_cam, overlay
 from vis.utils import utils
 from matplotlib import pyplot as plt
+from DataExtractor.batch_augmenter import BatchAugmenter
+from DataExtractor.dataset import Dataset
+from Tester.tflite_model import TFLiteModel
+from Trainer.Utils.input_pipeline import AugmentationSequence, InputPipelineMonitor
 
 # only show tensorflow errors
 tf.logging.set_verbosity(tf.logging.ERROR)
@@ -33,39 +35,76 @@ os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
 
 class Model:
 
-    def __init__(self, model_name):
+    def __init__(self, model_name, inference_only=False):
         # specify the model
         self.model = None
         self.model_name = model_name
+        # a model for inference only is created without optimizer and without loading the training data
+        self.inference_only = inference_only
+
+        self.optimizer = None
+        self.tensorboard = None
+        # uint8 images of the dataset, memory mapped, the splits are indices into them
+        self.images = None
+        self.trainIndices = None
+        self.testIndices = None
+        self.trainY = None
+        self.testY = None
+        self.lb = None
 
-        # specify learning rate for optimizer
-        self.optimizer = Adam(lr=1e-3)
+        self.logger = None
+        self.__create_logger()
+
+        if not inference_only:
+            # specify learning rate for optimizer
+            self.optimizer = Adam(lr=1e-3)
 
-        # to start tensorboard run: tensorboard --logdir=logs/, in working directory
-        self.tensorboard = TensorBoard(log_dir='logs/{}'.format(model_name))
+            # to start tensorboard run: tensorboard --logdir=logs/, in working directory
+            self.tensorboard = TensorBoard(log_dir='logs/{}'.format(model_name))
 
-        # load the image data and scale the pixels intensities to range [0, 1]
-        X = pickle.load(open('../X.pickle', 'rb'))
-        X = X / 255
+            self.__load_training_data()
 
-        # load the image data labels
-        y = pickle.load(open('../y.pickle', 'rb'))
+        self.logger.info('Creating model: {}'.format(model_name))
 
-        # train test split
-        (self.trainX, self.testX, self.trainY, self.testY) = train_test_split(X, y,
-                                                                              test_size=constants.VALIDATION_SPLIT,
-                                                                              random_state=42)
+    def create_model(self, weights_path=None):
+        raise NotImplementedError
+
+    def load_model_for_inference(self, model_name=None):
+        # builds the architecture and loads the weights of a trained model from the model directory
+        model_path = '{}{}.h5'.format(constants.MODEL_DIR, model_name or self.model_name)
+        self.create_model(weights_path=model_path)
+
+        return self.model
+
+    def __load_training_data(self):
+        # the dataset stays memory mapped, the images are read and scaled to range [0, 1] per batch
+        dataset = self.__load_dataset()
+
+        (self.trainIndices, self.testIndices) = dataset.split(constants.VALIDATION_SPLIT)
+        self.images = dataset.images
+        self.trainY = dataset.get_label_names(dataset.labels[self.trainIndices])
+        self.testY = dataset.get_label_names(dataset.labels[self.testIndices])
         self.lb = LabelBinarizer()
         self.trainY = self.lb.fit_transform(self.trainY)
         self.testY = self.lb.transform(self.testY)
 
-        self.logger = None
-        self.__create_logger()
+    @staticmethod
+    def __load_dataset():
+        dataset = Dataset(constants.DATASET_DIR)
+        # convert the data of the old format once
+        if not dataset.exists() and os.path.exists('../X.pickle'):
+            dataset.convert_pickles('../X.pickle', '../y.pickle', constants.CATEGORIES, constants.IMG_SIZE,
+                                    constants.DIMENSION)
 
-        self.logger.info('Creating model: {}'.format(model_name))
+        return dataset.read()
 
-    def create_model(self, weights_path=None):
-        raise NotImplementedError
+    def __create_sequence(self, indices, labels, augmenter=None, shuffle=False):
+        return AugmentationSequence(self.images, labels, constants.BATCH_SIZE, augmenter,
+                                    seed=constants.AUGMENTATION_SEED, indices=indices, shuffle=shuffle)
+
+    def __get_images(self, indices):
+        # images of the memory map scaled like the batches of the sequences
+        return np.multiply(self.images[indices], constants.INPUT_SCALE, dtype=np.float32)
 
     def save_model(self, visualize_model=False):
         self.logger.info('Saving model')
@@ -75,19 +114,20 @@ class Model:
         if visualize_model:
             self.__visualize_model()
 
-    def train_model(self):
+    def train_model(self, initial_epoch=0, epochs=constants.EPOCHS):
+        # initial_epoch > 0 continues the training of a loaded model, e.g. in the successive halving sweep
         self.logger.info('Training model')
-        self.model.fit(self.trainX, self.trainY,
-                       validation_data=(self.testX, self.testY),
-                       batch_size=constants.BATCH_SIZE,
-                       epochs=constants.EPOCHS,
-                       callbacks=[self.tensorboard])
+        self.model.fit_generator(self.__create_sequence(self.trainIndices, self.trainY, shuffle=True),
+                                 validation_data=self.__create_sequence(self.testIndices, self.testY),
+                                 epochs=epochs,
+                                 initial_epoch=initial_epoch,
+                                 callbacks=[self.tensorboard])
 
-        self.__evaluate_model()
+        return self.__evaluate_model()
 
     def train_model_with_generator(self):
-        self.logger.info('Training model with image data generator')
-        image_data_gen = ImageDataGenerator(
+        self.logger.info('Training model with augmentation input pipeline')
+        augmenter = BatchAugmenter(
             rotation_range=15,
             width_shift_range=0.1,
             height_shift_range=0.1,
@@ -96,21 +136,29 @@ class Model:
             brightness_range=[0.5, 1.5],
             fill_mode='reflect')
 
-        image_data_gen.fit(self.trainX)
+        # the batches are augmented by several worker threads and prefetched into a queue
+        sequence = self.__create_sequence(self.trainIndices, self.trainY, augmenter, shuffle=True)
+        monitor = InputPipelineMonitor(self.logger, sequence)
 
-        self.model.fit_generator(image_data_gen.flow(self.trainX, self.trainY, batch_size=constants.BATCH_SIZE),
-                                 validation_data=(self.testX, self.testY),
-                                 steps_per_epoch=len(self.trainX) // constants.BATCH_SIZE,
-                                 epochs=constants.EPOCHS)
+        self.model.fit_generator(sequence,
+                                 validation_data=self.__create_sequence(self.testIndices, self.testY),
+                                 epochs=constants.EPOCHS,
+                                 workers=constants.TRAINING_WORKERS,
+                                 use_multiprocessing=False,
+                                 max_queue_size=constants.TRAINING_PREFETCH,
+                                 callbacks=[self.tensorboard, monitor])
 
         self.__evaluate_model()
 
     def __evaluate_model(self):
         self.logger.info('Evaluating network')
-        predictions = self.model.predict(self.testX, batch_size=constants.BATCH_SIZE)
+        predictions = self.model.predict_generator(self.__create_sequence(self.testIndices, self.testY))
         self.logger.info(classification_report(self.testY.argmax(axis=1),
                                                predictions.argmax(axis=1), target_names=self.lb.classes_))
 
+        # accuracy on the validation split
+        return float(np.mean(predictions.argmax(axis=1) == self.testY.argmax(axis=1)))
+
     def convert_model_tensorflow(self):
         self.logger.info('Saving model for tensorflow')
         model_output_path = '{}{}.pb'.format(constants.MODEL_DIR, self.model_name)
@@ -134,6 +182,70 @@ class Model:
         tf.train.write_graph(frozen_graph, output_path, output_name, as_text=False)
         self.logger.info('Successfully saved model to: {}'.format(model_output_path))
 
+    def convert_model_tflite(self, quantizations=('float16', 'int8')):
+        if self.inference_only:
+            self.logger.error('Converting to tflite needs the training data, '
+                              'create the model with inference_only=False')
+            return
+
+        model_input_path = '{}{}.h5'.format(constants.MODEL_DIR, self.model_name)
+        keras_model = keras.models.load_model(model_input_path)
+
+        # 0: name, 1: predict function, 2: size of the model in bytes
+        backends = [['keras', keras_model.predict, os.path.getsize(model_input_path)]]
+
+        for quantization in quantizations:
+            self.logger.info('Saving model for tflite ({})'.format(quantization))
+            converter = tf.lite.TFLiteConverter.from_keras_model_file(model_input_path)
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+            if quantization == 'float16':
+                converter.target_spec.supported_types = [tf.float16]
+            elif quantization == 'int8':
+                # the ranges of the activations are calibrated with a subset of the training data
+                converter.representative_dataset = self.__create_representative_dataset
+                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+                converter.inference_input_type = tf.uint8
+                converter.inference_output_type = tf.uint8
+            else:
+                raise ValueError('unknown quantization {}'.format(quantization))
+
+            model_output_path = '{}{}-{}.tflite'.format(constants.MODEL_DIR, self.model_name, quantization)
+            with open(model_output_path, 'wb') as model_file:
+                model_file.write(converter.convert())
+            self.logger.info('Successfully saved model to: {}'.format(model_output_path))
+
+            tflite_model = TFLiteModel(model_output_path)
+            backends.append([quantization, tflite_model.predict, os.path.getsize(model_output_path)])
+
+        self.__compare_backends(backends)
+
+    def __create_representative_dataset(self):
+        random_state = np.random.RandomState(42)
+        count = min(constants.TFLITE_CALIBRATION_SIZE, len(self.trainIndices))
+        for index in random_state.choice(len(self.trainIndices), count, replace=False):
+            yield [self.__get_images(self.trainIndices[index:index + 1])]
+
+    def __compare_backends(self, backends, count_latency=200):
+        # accuracy on the validation split and latency of a single image, as the tester classifies few rois
+        labels = self.testY.argmax(axis=1)
+        sequence = self.__create_sequence(self.testIndices, self.testY)
+        latency_images = self.__get_images(self.testIndices[:count_latency])
+        for name, predict, size in backends:
+            predictions = np.concatenate([predict(sequence[index][0], batch_size=constants.BATCH_SIZE)
+                                          for index in range(len(sequence))])
+            accuracy = np.mean(predictions.argmax(axis=1) == labels)
+
+            times = []
+            for index in range(len(latency_images)):
+                start = time.perf_counter()
+                predict(latency_images[index:index + 1], batch_size=1)
+                times.append(time.perf_counter() - start)
+            times = np.array(times) * 1000
+
+            self.logger.info('[{}] accuracy: {:.4f}, latency: p50 {:.3f}ms, p95 {:.3f}ms, size: {:.1f}KB'.format(
+                name, accuracy, np.percentile(times, 50), np.percentile(times, 95), size / 1024))
+
     def __freeze_session(self, session, keep_var_names=None, output_names=None, clear_devices=True):
         graph = session.graph
         with graph.as_default():
@@ -213,13 +325,14 @@ class Model:
             indices = np.where(self.testY[:, class_idx] == 1.)[0]
             idx = random.choice(indices)
 
+            image = self.__get_images(self.testIndices[idx])
             f, ax = plt.subplots(1, 4)
-            ax[0].imshow(self.testX[idx][..., 0])
+            ax[0].imshow(image[..., 0])
 
             for i, modifier in enumerate([None, 'guided', 'relu']):
                 grads = visualize_saliency(model, layer_idx,
                                            filter_indices=class_idx,
-                                           seed_input=self.testX[idx],
+                                           seed_input=image,
                                            backprop_modifier=modifier,
                                            grad_modifier='negate')
                 if modifier is None:
@@ -253,26 +366,27 @@ class Model:
             indices = np.where(self.testY[:, class_idx] == 1.)[0]
             idx = random.choice(indices)
 
+            image = self.__get_images(self.testIndices[idx])
             f, ax = plt.subplots(1, 4)
-            ax[0].imshow(self.testX[idx][..., 0])
+            ax[0].imshow(image[..., 0])
 
             for i, modifier in enumerate([None, 'guided', 'relu']):
                 grads = visualize_cam(model, layer_idx,
                                       filter_indices=None,
-                                      seed_input=self.testX[idx],
+                                      seed_input=image,
                                       backprop_modifier=modifier)
 
                 # create heat map to overlay on image
                 jet_heat_map = np.uint8(cm.jet(grads)[..., :3] * 255)
-                image = np.asarray(self.testX[idx] * 255, np.uint8)
+                image_overlay = np.asarray(self.images[self.testIndices[idx]])
                 if constants.USE_GRAY_SCALE:
-                    image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+                    image_overlay = cv2.cvtColor(image_overlay, cv2.COLOR_GRAY2RGB)
 
                 if modifier is None:
                     modifier = 'vanilla'
 
                 ax[i + 1].set_title(modifier)
-                ax[i + 1].imshow(overlay(jet_heat_map, image))
+                ax[i + 1].imshow(overlay(jet_heat_map, image_overlay))
 
             # save the plot
             plot_name = 'heat-map-{}.png'.format(constants.CATEGORIES[class_idx])
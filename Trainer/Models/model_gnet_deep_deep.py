@@ -7,10 +7,10 @@ from keras.layers import Conv2D, MaxPooling2D
 
 class ModelGNetDeepDeep(Model):
 
-    def __init__(self, name_postfix):
+    def __init__(self, name_postfix, inference_only=False):
         # call the init method from superclass
         model_name = 'CNN-gnet-deep-v3-{}'.format(name_postfix)
-        super().__init__(model_name)
+        super().__init__(model_name, inference_only)
 
     def create_model(self, weights_path=None):
         # create model
@@ -39,9 +39,11 @@ class ModelGNetDeepDeep(Model):
         if weights_path:
             self.model.load_weights(weights_path)
 
-        self.model.compile(loss='categorical_crossentropy',
-                           optimizer=self.optimizer,
-                           metrics=['accuracy'])
+        # a model only used for predictions does not need an optimizer
+        if not self.inference_only:
+            self.model.compile(loss='categorical_crossentropy',
+                               optimizer=self.optimizer,
+                               metrics=['accuracy'])
 
         # display summary of the created model
         self.model.summary()
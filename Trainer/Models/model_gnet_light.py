@@ -7,10 +7,10 @@ from keras.layers import Conv2D, MaxPooling2D
 
 class ModelGNetLight(Model):
 
-    def __init__(self, name_postfix):
+    def __init__(self, name_postfix, inference_only=False):
         # call the init method from superclass
         model_name = 'CNN-gnet-light-{}'.format(name_postfix)
-        super().__init__(model_name)
+        super().__init__(model_name, inference_only)
 
     def create_model(self, weights_path=None):
         # create model
@@ -34,9 +34,11 @@ class ModelGNetLight(Model):
         if weights_path:
             self.model.load_weights(weights_path)
 
-        self.model.compile(loss='categorical_crossentropy',
-                           optimizer=self.optimizer,
-                           metrics=['accuracy'])
+        # a model only used for predictions does not need an optimizer
+        if not self.inference_only:
+            self.model.compile(loss='categorical_crossentropy',
+                               optimizer=self.optimizer,
+                               metrics=['accuracy'])
 
         # display summary of the created model
         self.model.summary()
@@ -0,0 +1,237 @@
+import csv
+import logging
+import os
+import time
+import numpy as np
+import constants
+from DataExtractor.dataset import Dataset
+from DataExtractor.parallel_executor import ParallelExecutor
+from Tester.numpy_model import NumpyModel
+
+RESULTS_COLUMNS = ['rank', 'model_name', 'conv_layers', 'layer_size', 'dense_layers', 'epochs', 'accuracy', 'params',
+                   'latency_p50_ms', 'latency_p95_ms', 'train_s']
+
+
+class HyperparameterSweep:
+
+    def __init__(self, name_postfix, count_workers=constants.SWEEP_WORKERS):
+        self.name_postfix = name_postfix
+
+        # every worker trains one configuration at a time with an equal share of the cpu cores
+        self.count_workers = count_workers or max(1, (os.cpu_count() or 1) // 2)
+        self.count_threads = max(1, (os.cpu_count() or 1) // self.count_workers)
+
+        self.logger = None
+        self.__create_logger()
+
+    def run(self, dense_layers=(0, 1, 2), layer_sizes=(16, 32, 64), conv_layers=(1, 2, 3), count_latency=200):
+        # every configuration is trained for all epochs,
+        # the workers memory map the dataset and share its pages instead of copying the data
+        rows = self.__create_rows(dense_layers, layer_sizes, conv_layers)
+        rows = self.__train(rows, constants.EPOCHS)
+        rows = self.__measure_latencies(rows, count_latency)
+
+        return self.__rank(rows)
+
+    def run_successive_halving(self, dense_layers=(0, 1, 2), layer_sizes=(16, 32, 64), conv_layers=(1, 2, 3),
+                               min_epochs=constants.SWEEP_MIN_EPOCHS,
+                               reduction_factor=constants.SWEEP_REDUCTION_FACTOR, count_latency=200):
+        # every configuration is trained for min_epochs, only the best 1 / reduction_factor of them are trained
+        # further for reduction_factor times the epochs, until the survivors are trained for all epochs
+        rows = self.__create_rows(dense_layers, layer_sizes, conv_layers)
+        candidates = rows
+        epochs = min(min_epochs, constants.EPOCHS)
+
+        while True:
+            self.logger.info('[sweep] training {} configurations up to epoch {}'.format(len(candidates), epochs))
+            # the survivors resume from the checkpoints of the previous round
+            self.__train(candidates, epochs)
+            candidates = [row for row in candidates if row['epochs'] == epochs]
+            if epochs >= constants.EPOCHS or len(candidates) == 0:
+                break
+
+            candidates.sort(key=lambda row: -row['accuracy'])
+            candidates = candidates[:max(1, len(candidates) // reduction_factor)]
+            # a single survivor is trained for all epochs at once
+            epochs = constants.EPOCHS if len(candidates) == 1 else min(epochs * reduction_factor, constants.EPOCHS)
+
+        rows = self.__measure_latencies([row for row in rows if row['epochs'] > 0], count_latency)
+
+        self.logger.info('[sweep] trained {} epochs, a full sweep trains {} epochs'.format(
+            sum(row['epochs'] for row in rows), len(rows) * constants.EPOCHS))
+
+        return self.__rank(rows)
+
+    def __create_rows(self, dense_layers, layer_sizes, conv_layers):
+        rows = []
+        for dense_layer in dense_layers:
+            for layer_size in layer_sizes:
+                for conv_layer in conv_layers:
+                    # give the model a name to create it again
+                    model_name = "{}-conv-{}-nodes-{}-dense-{}-{}".format(conv_layer, layer_size, dense_layer,
+                                                                          int(time.time()), self.name_postfix)
+                    rows.append({'model_name': model_name,
+                                 'conv_layers': conv_layer,
+                                 'layer_size': layer_size,
+                                 'dense_layers': dense_layer,
+                                 'epochs': 0,
+                                 'train_s': 0.0})
+
+        return rows
+
+    def __train(self, rows, epochs):
+        # trains the configurations from their current epoch up to epochs, the rows are updated with the results
+        count_workers = min(self.count_workers, len(rows))
+        self.logger.info('Training {} configurations with {} workers of {} threads'.format(
+            len(rows), count_workers, self.count_threads))
+
+        tasks = [(row['model_name'], row['conv_layers'], row['layer_size'], row['dense_layers'], self.count_threads,
+                  row['epochs'], epochs) for row in rows]
+
+        # spawned workers, tensorflow is imported in every worker with its own thread limits
+        executor = ParallelExecutor(count_workers, use_processes=True, start_method='spawn')
+        results, errors = executor.map(train_configuration, tasks)
+        for task, message in errors:
+            self.logger.error('[sweep] {} failed: {}'.format(task[0], message))
+
+        for row, result in zip(rows, results):
+            if result is not None:
+                row['accuracy'] = result['accuracy']
+                row['params'] = result['params']
+                row['epochs'] = epochs
+                row['train_s'] += result['train_s']
+
+        return [row for row in rows if row['epochs'] > 0]
+
+    def __measure_latencies(self, rows, count_latency):
+        # the latency is measured after the training, so that the configurations do not compete for the cores,
+        # with the first images of the validation split scaled like the training data
+        dataset = Dataset(constants.DATASET_DIR).read()
+        (_, test_indices) = dataset.split(constants.VALIDATION_SPLIT)
+        testX = np.multiply(dataset.images[test_indices[:count_latency]], constants.INPUT_SCALE, dtype=np.float32)
+
+        return [self.__measure_latency(row, testX, count_latency) for row in rows]
+
+    def __rank(self, rows):
+        # the configurations trained for the most epochs first, eliminated ones are only compared with each other
+        rows.sort(key=lambda row: (-row['epochs'], -row['accuracy'], row['latency_p50_ms'], row['params']))
+        for rank, row in enumerate(rows):
+            row['rank'] = rank + 1
+
+        self.__write_results(rows)
+
+        return rows
+
+    def __measure_latency(self, row, testX, count_latency):
+        # single image latency of the saved model in the numpy runtime, the same path as the tester for few rois
+        try:
+            predict = NumpyModel('{}{}.h5'.format(constants.MODEL_DIR, row['model_name'])).predict
+        except Exception as e:
+            self.logger.warning('[sweep] no latency for {} ({}: {})'.format(row['model_name'], type(e).__name__, e))
+            # ranked last of the configurations with the same accuracy
+            row['latency_p50_ms'] = float('inf')
+            row['latency_p95_ms'] = float('inf')
+            return row
+
+        times = []
+        for index in range(min(count_latency, len(testX))):
+            start = time.perf_counter()
+            predict(testX[index:index + 1], batch_size=1)
+            times.append(time.perf_counter() - start)
+        times = np.array(times) * 1000
+
+        row['latency_p50_ms'] = float(np.percentile(times, 50))
+        row['latency_p95_ms'] = float(np.percentile(times, 95))
+        return row
+
+    def __write_results(self, rows):
+        results_path = '{}sweep-{}.csv'.format(constants.MODEL_DIR, self.name_postfix)
+        with open(results_path, 'w', newline='') as results_file:
+            writer = csv.DictWriter(results_file, fieldnames=RESULTS_COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+
+        for row in rows:
+            self.logger.info('[sweep] #{:<3d} {:<60s} epochs {:>3d}, accuracy {:.4f}, params {:>9d}, '
+                             'latency p50 {:7.3f}ms, train {:6.1f}s'.format(row['rank'], row['model_name'],
+                                                                            row['epochs'], row['accuracy'],
+                                                                            row['params'], row['latency_p50_ms'],
+                                                                            row['train_s']))
+        self.logger.info('Saved results of {} configurations to: {}'.format(len(rows), results_path))
+
+    def __create_logger(self):
+        self.logger = logging.getLogger('HyperparameterSweep')
+        self.logger.setLevel(constants.LOG_LEVEL)
+        ch = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        ch.setFormatter(formatter)
+        self.logger.addHandler(ch)
+
+
+def train_configuration(task):
+    # runs in a spawned worker, trains a configuration from initial_epoch up to epochs and saves it as checkpoint
+    (model_name, conv_layer, layer_size, dense_layer, count_threads, initial_epoch, epochs) = task
+
+    # the thread pools of the math libraries are sized when tensorflow is imported
+    os.environ['OMP_NUM_THREADS'] = str(count_threads)
+    import tensorflow as tf
+    from keras import backend
+    from keras.models import load_model
+    from Trainer.Models.model import Model
+
+    # a new session for every configuration, the graphs of earlier configurations are freed
+    backend.clear_session()
+    backend.set_session(tf.Session(config=tf.ConfigProto(intra_op_parallelism_threads=count_threads,
+                                                         inter_op_parallelism_threads=1)))
+
+    # the model memory maps the dataset, the pages are shared by all workers
+    model_obj = Model(model_name)
+    if initial_epoch > 0:
+        # the checkpoint contains the weights and the state of the optimizer
+        model_obj.model = load_model('{}{}.h5'.format(constants.MODEL_DIR, model_name))
+    else:
+        create_model(model_obj, conv_layer, layer_size, dense_layer)
+
+    start = time.perf_counter()
+    accuracy = model_obj.train_model(initial_epoch=initial_epoch, epochs=epochs)
+    train_time = time.perf_counter() - start
+    model_obj.save_model()
+
+    return {'accuracy': accuracy,
+            'params': int(model_obj.model.count_params()),
+            'train_s': train_time}
+
+
+def create_model(model_obj, conv_layer, layer_size, dense_layer):
+    from keras.models import Sequential
+    from keras.layers import Dense, Activation, Flatten
+    from keras.layers import Conv2D, MaxPooling2D
+
+    # create model
+    model_obj.model = Sequential()
+
+    # add model layers
+    model_obj.model.add(Conv2D(layer_size,
+                               kernel_size=3,
+                               input_shape=(constants.IMG_SIZE, constants.IMG_SIZE, constants.DIMENSION)))
+    model_obj.model.add(Activation('relu'))
+    model_obj.model.add(MaxPooling2D(pool_size=(2, 2)))
+
+    for _ in range(conv_layer - 1):
+        model_obj.model.add(Conv2D(layer_size, kernel_size=3))
+        model_obj.model.add(Activation('relu'))
+        model_obj.model.add(MaxPooling2D(pool_size=(2, 2)))
+
+    model_obj.model.add(Flatten())
+
+    for _ in range(dense_layer):
+        model_obj.model.add(Dense(layer_size))
+        model_obj.model.add(Activation('relu'))
+
+    model_obj.model.add(Dense(len(constants.CATEGORIES)))
+    model_obj.model.add(Activation('softmax'))
+
+    model_obj.model.compile(loss='categorical_crossentropy',
+                            optimizer=model_obj.optimizer,
+                            metrics=['accuracy'])
@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+import numpy as np
+import constants
+from keras.callbacks import Callback
+from keras.utils import Sequence
+
+
+class AugmentationSequence(Sequence):
+
+    def __init__(self, images, labels, batch_size, augmenter=None, seed=None, indices=None, shuffle=True):
+        # images: the decoded, not augmented uint8 images (e.g. memory mapped), they are read, augmented (if an
+        # augmenter is given) and scaled per batch, indices: the images of the sequence (e.g. the training split),
+        # labels: one row per image of the sequence
+        self.images = images
+        self.image_indices = indices if indices is not None else np.arange(len(images))
+        self.labels = labels
+        self.batch_size = batch_size
+        self.augmenter = augmenter
+
+        self.seed = seed if seed is not None else np.random.randint(0, 2 ** 31 - 1)
+        self.epoch = 0
+        # the validation and the predictions keep the order of the images
+        self.shuffle = shuffle
+        self.indices = np.arange(len(self.image_indices))
+        if shuffle:
+            self.__shuffle()
+
+        # time the workers spent on creating batches, for the InputPipelineMonitor
+        self.lock = threading.Lock()
+        self.count_batches = 0
+        self.time_batches = 0
+
+    def __len__(self):
+        return int(math.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, index):
+        start = time.perf_counter()
+
+        batch_indices = np.sort(self.indices[index * self.batch_size:(index + 1) * self.batch_size])
+
+        batch_images = self.images[self.image_indices[batch_indices]]
+        if self.augmenter is not None:
+            # every batch has its own seed, the workers create the batches in any order
+            random_state = np.random.RandomState((self.seed + self.epoch * len(self) + index) % (2 ** 31 - 1))
+            batch_images = self.augmenter.augment(batch_images, random_state)
+        # scale the pixels intensities to range [0, 1]
+        batch_x = np.multiply(batch_images, constants.INPUT_SCALE, dtype=np.float32)
+        batch_y = self.labels[batch_indices]
+
+        with self.lock:
+            self.count_batches += 1
+            self.time_batches += time.perf_counter() - start
+
+        return batch_x, batch_y
+
+    def on_epoch_end(self):
+        self.epoch += 1
+        if self.shuffle:
+            self.__shuffle()
+
+    def get_statistics(self, reset=True):
+        with self.lock:
+            statistics = {'batches': self.count_batches,
+                          'mean_time_batch_ms': self.time_batches / max(self.count_batches, 1) * 1000}
+            if reset:
+                self.count_batches = 0
+                self.time_batches = 0
+
+        return statistics
+
+    def __shuffle(self):
+        np.random.RandomState((self.seed + self.epoch) % (2 ** 31 - 1)).shuffle(self.indices)
+
+
+class InputPipelineMonitor(Callback):
+
+    def __init__(self, logger, sequence=None):
+        super().__init__()
+        self.logger = logger
+        self.sequence = sequence
+
+        self.time_epoch_start = 0
+        self.time_last_batch_end = 0
+        self.time_input_wait = 0
+        self.count_steps = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.time_epoch_start = time.perf_counter()
+        self.time_last_batch_end = self.time_epoch_start
+        self.time_input_wait = 0
+        self.count_steps = 0
+
+    def on_batch_begin(self, batch, logs=None):
+        # the time between two training steps is spent waiting for the next batch
+        self.time_input_wait += time.perf_counter() - self.time_last_batch_end
+
+    def on_batch_end(self, batch, logs=None):
+        self.time_last_batch_end = time.perf_counter()
+        self.count_steps += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        # the validation at the end of the epoch is not counted
+        time_training = self.time_last_batch_end - self.time_epoch_start
+        message = '[Input pipeline] epoch {}: {:.2f} steps/s, input wait {:.2f}s ({:.1f}% of {:.2f}s)'.format(
+            epoch + 1, self.count_steps / max(time_training, 1e-9), self.time_input_wait,
+            self.time_input_wait / max(time_training, 1e-9) * 100, time_training)
+
+        if self.sequence is not None:
+            statistics = self.sequence.get_statistics()
+            message += ', {} batches created, {:.1f}ms per batch'.format(statistics['batches'],
+                                                                        statistics['mean_time_batch_ms'])
+
+        self.logger.info(message)
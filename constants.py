@@ -5,15 +5,60 @@ OUTPUT_DATA_DIR = "data_extracted"
 CATEGORIES = ["-1", "1", "2", "3", "4", "5", "6", "7", "8", "9"]
 
 MODEL_DIR = "../TrainedModels/"
+# memory-mappable training data written by the extractor (see DataExtractor/dataset.py)
+DATASET_DIR = "../Dataset/"
+# preprocessed images of earlier runs of create_training_data (see DataExtractor/preprocessing_cache.py)
+PREPROCESSING_CACHE_DIR = "../PreprocessingCache/"
 
 IMG_SIZE = 28
 USE_GRAY_SCALE = True
 DIMENSION = 1
+# the models are trained on pixel intensities scaled to [0, 1], the tester scales its input the same way
+INPUT_SCALE = 1 / 255
 
 SIGNAL_TYPES = ["info", "stop"]
 
+# integer only gradient preprocessing in the isolator (see Isolator.__threshold_gradient)
+USE_FAST_PREPROCESSING = False
+# contour detection on a downscaled copy of the image, the rois are cropped in full resolution
+USE_FAST_ISOLATION = False
+FAST_ISOLATION_SCALE = 0.5
+# only search around the boxes of the previous frame, with a full search every TRACKING_FULL_SEARCH_INTERVAL frames
+USE_TRACKING = False
+TRACKING_FULL_SEARCH_INTERVAL = 30
+TRACKING_WINDOW_MARGIN = 0.5
+# a full search is done instead if the window around the boxes covers more than this fraction of the band,
+# e.g. at 640x480 the window around the digits of a sign covers most of the band and tracking is not faster
+TRACKING_MAX_WINDOW_FRACTION = 0.75
+
+# workers of the extractor file operations (None: one per cpu core), processes instead of threads
+EXTRACTOR_WORKERS = None
+EXTRACTOR_USE_PROCESSES = False
+# auto labelling with a trained model, the predictions are saved to the report in the working directory
+CATEGORIZE_BATCH_SIZE = 512
+CATEGORIZE_CONFIDENCE = 0.99
+CATEGORIZE_REPORT_NAME = 'categorize_report.csv'
+# near-duplicate images in the categories, hamming distance of the 64 bit perceptual hashes
+DUPLICATE_INDEX_DIR = "../DuplicateIndex/"
+DUPLICATE_MAX_DISTANCE = 4
+DUPLICATE_REPORT_NAME = 'duplicate_report.csv'
+# catalog of the images in the output directory in the working directory (see DataExtractor/catalog.py)
+CATALOG_NAME = 'catalog.sqlite'
+# seed of the batch augmentation (None: random)
+AUGMENTATION_SEED = None
+
 BATCH_SIZE = 128
+# threads that augment the batches of train_model_with_generator and the count of batches prepared ahead
+TRAINING_WORKERS = 4
+TRAINING_PREFETCH = 10
 EPOCHS = 15
 VALIDATION_SPLIT = 0.25
+# images of the training data used to calibrate the int8 quantization of the tflite model
+TFLITE_CALIBRATION_SIZE = 200
+# worker processes of the hyperparameter sweep (None: one per two cpu cores), the cores are split between them
+SWEEP_WORKERS = None
+# successive halving: epochs of the first round, only the best 1 / SWEEP_REDUCTION_FACTOR are trained further
+SWEEP_MIN_EPOCHS = 2
+SWEEP_REDUCTION_FACTOR = 3
 
 LOG_LEVEL = logging.INFO